@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+""""
+Description: bgp_eoiu_benchmark.py -- benchmarking bgp eoiu detection of bgp_eoiu_marker.py.
+    The script runs BgpStateCheck against a local redis, with a stand-in of vtysh which replays bgp json output.
+    The json output is either generated for the given numbers of peers (10/100/1000 by default) spread over
+    --vrfs vrfs, or recorded on a device with:
+        vtysh -c 'show bgp vrf all summary json' > summary.json
+        vtysh -c 'show bgp vrf all neighbors json' > neighbors.json
+    and passed with --record <dir>.
+
+    The EOR of the neighbors become visible one by one, spread over --eor-spread seconds. The detection latency
+    is the time from the last EOR being visible to both eoiu markers being set in stateDB.
+
+    The timeline of each run is printed and may be saved as json with --output, so the detection latency can
+    be compared between commits.
+
+    Use a scratch redis database (--db), the eoiu markers and BGP_NEIGH_EOR_TABLE entries of that database
+    are flushed.
+"""
+
+import os
+import sys
+import json
+import redis
+import shutil
+import tempfile
+import argparse
+from bgp_eoiu_marker import BgpStateCheck
+
+# stand-in of vtysh, it only supports the show commands used by bgp_eoiu_marker.py
+VTYSH_STANDIN = '''#!/usr/bin/env python
+import os
+import sys
+import time
+import json
+
+data_dir = os.path.dirname(os.path.abspath(__file__))
+cmd = sys.argv[2].split()
+vrf = 'default'
+if cmd[2] == 'vrf':
+    vrf = cmd[3]
+    cmd = cmd[:2] + cmd[4:]
+
+if cmd[2] == 'summary':
+    print open(os.path.join(data_dir, 'summary.json')).read()
+    sys.exit(0)
+
+vrf_neighbors = json.load(open(os.path.join(data_dir, 'neighbors.json')))
+release = json.load(open(os.path.join(data_dir, 'release.json')))
+if cmd[3] != 'json':
+    neighbors = vrf_neighbors.get(vrf, {})
+    vrf_neighbors = {vrf: {cmd[3]: neighbors[cmd[3]]} if cmd[3] in neighbors else {}}
+
+now = time.time()
+for neigh_vrf, neighbors in vrf_neighbors.items():
+    for neigh, status in neighbors.items():
+        if not isinstance(status, dict):
+            continue
+        eor_info = status.setdefault('gracefulRestartInfo', {}).setdefault('endOfRibRecv', {})
+        for afi in eor_info.keys():
+            eor_info[afi] = now >= release.get(neigh_vrf + '|' + neigh, 0)
+
+if vrf != 'all':
+    vrf_neighbors = vrf_neighbors[vrf]
+print json.dumps(vrf_neighbors)
+'''
+
+def gen_peers(num_peers, num_vrfs):
+    ipv4_peers = ["10.%d.%d.%d" % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff) for i in range(1, num_peers / 2 + 1)]
+    ipv6_peers = ["fc00::%x" % i for i in range(1, num_peers - len(ipv4_peers) + 1)]
+    vrfs = ['default'] + ['Vrf%d' % i for i in range(1, num_vrfs)]
+
+    summary = {}
+    neighbors = {}
+    for i, peer in enumerate(ipv4_peers + ipv6_peers):
+        vrf = vrfs[i % len(vrfs)]
+        afi_safi, afi = ('ipv4Unicast', 'IPv4 Unicast') if i < len(ipv4_peers) else ('ipv6Unicast', 'IPv6 Unicast')
+        summary.setdefault(vrf, {}).setdefault(afi_safi, {'peers': {}})['peers'][peer] = {'state': 'Established'}
+        neighbors.setdefault(vrf, {'vrfName': vrf})[peer] = {
+            'bgpState': 'Established',
+            'gracefulRestartInfo': {'endOfRibRecv': {afi: False}},
+            'messageStats': {'keepalivesRecv': 1},
+        }
+    return summary, neighbors
+
+def load_record(record_dir):
+    summary = json.load(open(os.path.join(record_dir, 'summary.json')))
+    neighbors = json.load(open(os.path.join(record_dir, 'neighbors.json')))
+    return summary, neighbors
+
+def run_benchmark(summary, neighbors, state_db, args):
+    work_dir = tempfile.mkdtemp(prefix='bgp_eoiu_benchmark')
+    try:
+        vtysh = os.path.join(work_dir, 'vtysh')
+        with open(vtysh, 'w') as f:
+            f.write(VTYSH_STANDIN)
+        os.chmod(vtysh, 0755)
+        with open(os.path.join(work_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f)
+        with open(os.path.join(work_dir, 'neighbors.json'), 'w') as f:
+            json.dump(neighbors, f)
+
+        bgp_state_check = BgpStateCheck(vtysh, not args.per_neighbor, args.workers, state_db)
+        bgp_state_check.clean_bgp_eoiu_marker()
+        bgp_state_check.clean_bgp_neigh_eor_state()
+        bgp_state_check.set_bgp_eoiu_marker(["IPv4", "IPv6"], "unknown")
+
+        # spread the eor of the neighbors over eor_spread seconds after the start
+        peers = sorted(vrf + '|' + neigh for vrf in neighbors for neigh in neighbors[vrf]
+                       if isinstance(neighbors[vrf][neigh], dict))
+        release = {}
+        for i, peer in enumerate(peers):
+            release[peer] = bgp_state_check.start_time + args.eor_spread * (i + 1) / len(peers)
+        with open(os.path.join(work_dir, 'release.json'), 'w') as f:
+            json.dump(release, f)
+
+        bgp_state_check.get_all_peers()
+        bgp_state_check.init_peers_eor_status()
+        bgp_state_check.wait_for_bgp_eoiu()
+        bgp_state_check.record_phase('done')
+
+        bgp_state_check.clean_bgp_eoiu_marker()
+        bgp_state_check.clean_bgp_neigh_eor_state()
+        bgp_state_check.close_db()
+    finally:
+        shutil.rmtree(work_dir)
+
+    last_eor = int((max(release.values()) - bgp_state_check.start_time) * 1000) if release else 0
+    reached = [entry['elapsed'] for entry in bgp_state_check.timeline if entry['phase'] == 'reached']
+    result = {
+        'peers': len(peers),
+        'mode': 'per-neighbor' if args.per_neighbor else 'bulk',
+        'converged': bgp_state_check.bgp_ipv4_eoiu and bgp_state_check.bgp_ipv6_eoiu,
+        'last_eor': last_eor,
+        'latency': max(reached) - last_eor if len(reached) == 2 else None,
+        'timeline': bgp_state_check.timeline,
+    }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bgp eoiu detection of bgp_eoiu_marker.py')
+    parser.add_argument('--peers', type=int, nargs='+', default=[10, 100, 1000],
+                        help='numbers of generated peers')
+    parser.add_argument('--vrfs', type=int, default=1,
+                        help='number of vrfs the generated peers are spread over, including the default vrf')
+    parser.add_argument('--record', default=None,
+                        help='directory with recorded summary.json and neighbors.json, replaces --peers')
+    parser.add_argument('--eor-spread', type=float, default=2.0,
+                        help='seconds over which the eor of the neighbors become visible')
+    parser.add_argument('--per-neighbor', action='store_true', default=False,
+                        help='query bgp neighbors one by one instead of one bulk query per check')
+    parser.add_argument('--workers', type=int, default=BgpStateCheck.DEF_MAX_WORKERS,
+                        help='max number of concurrent vtysh queries with --per-neighbor')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--db', type=int, default=15,
+                        help='scratch redis database used for the benchmark')
+    parser.add_argument('--output', default=None,
+                        help='save the results to this json file')
+    args = parser.parse_args()
+
+    state_db = redis.Redis(host=args.host, port=args.port, db=args.db)
+
+    if args.record:
+        inputs = [load_record(args.record)]
+    else:
+        inputs = [gen_peers(num_peers, args.vrfs) for num_peers in args.peers]
+
+    results = []
+    print "%-8s %-14s %-10s %-12s %-12s" % ('peers', 'mode', 'converged', 'last_eor_ms', 'latency_ms')
+    for summary, neighbors in inputs:
+        result = run_benchmark(summary, neighbors, state_db, args)
+        print "%-8d %-14s %-10s %-12d %-12s" % (result['peers'], result['mode'], result['converged'],
+                                               result['last_eor'], result['latency'])
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    return
+
+if __name__ == '__main__':
+    main()
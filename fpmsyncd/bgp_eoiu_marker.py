@@ -5,10 +5,27 @@ Description: bgp_eoiu_marker.py -- populating bgp eoiu marker flags in stateDB d
     The script is started by supervisord in bgp docker when the docker is started.
     It does not do anything in case neither system nor bgp warm restart is enabled.
 
-    The script check bgp neighbor state via vtysh cli interface periodically (every 1 second).
-    It looks for explicit EOR and implicit EOR (keep alive after established) in the json output of show ip bgp neighbors A.B.C.D json
-
-    Once the script has collected all needed EORs, it set a EOIU flags in stateDB.
+    The script check bgp neighbor state via vtysh cli interface periodically. The bulk query of all the neighbors
+    runs every second while a pending neighbor is Established, and with a backoff up to every 4 seconds while none is.
+    With --per-neighbor, each neighbor is checked quickly (every 0.25 second) once it is Established, and with
+    a backoff up to every 4 seconds while it is not.
+    It looks for explicit EOR and implicit EOR (keep alive after established) in the json output of show bgp vrf all neighbors json.
+    The neighbors of all the vrfs are discovered from show bgp vrf all summary json, a neighbor is identified by
+    its vrf and address.
+    By default the state of all neighbors is fetched with one bulk query per check, so the check time does not grow
+    with the number of peers. --per-neighbor falls back to one show bgp vrf V neighbors A.B.C.D json query per neighbor,
+    the neighbors are then probed concurrently by at most --workers vtysh processes at a time.
+    Either way, the json output is parsed once per check into an index shared by ipv4 and ipv6.
+
+    --vtysh may point to a stand-in of vtysh which prints recorded json output, which is enough to benchmark the script.
+
+    Once the script has collected all needed EORs of a family, it set the EOIU flag of that family in stateDB,
+    without waiting for the other family. The EOR state of every neighbor is kept in BGP_NEIGH_EOR_TABLE of stateDB,
+    so it is visible which neighbor is holding the convergence.
+
+    A timeline of the phases (peer discovery, eor of each neighbor, marker writes and the consumption of the markers
+    by fpmsyncd) is recorded in milliseconds since the start, it is kept in stateDB "BGP_STATE_TABLE|timeline" and
+    may also be dumped as json with --timeline-file.
 
     fpmsyncd may hold a few seconds (2~5 seconds) after getting the flag before starting routing reconciliation.
     2-5 seconds should be enough for all the route to be synced to fpmsyncd from bgp. If not, the system probably is already in wrong state.
@@ -23,6 +40,8 @@ import syslog
 import traceback
 import commands
 import json
+import argparse
+from multiprocessing.pool import ThreadPool
 from swsscommon import swsscommon
 import errno
 from time import gmtime, strftime
@@ -33,40 +52,137 @@ class BgpStateCheck():
 
     DEF_TIME_OUT = 120
 
-    # every 1 seconds to check bgp neighbors state
-    CHECK_INTERVAL = 1
-    def __init__(self):
+    # every 0.25 seconds to check bgp neighbors state at first and once a neighbor is Established,
+    # the interval is doubled up to 4 seconds per check while the neighbor is not Established yet
+    MIN_CHECK_INTERVAL = 0.25
+    MAX_CHECK_INTERVAL = 4
+
+    # the bulk query of all the neighbors is the largest json output of bgpd, it runs every second
+    # while a pending neighbor is Established, doubled up to MAX_CHECK_INTERVAL while none is
+    BULK_CHECK_INTERVAL = 1
+
+    # retry bgp summary after 1 second, doubled up to 5 seconds
+    PEERS_RETRY_INTERVAL = 1
+    MAX_PEERS_RETRY_INTERVAL = 5
+
+    # at most 8 vtysh processes at a time when neighbors are queried one by one,
+    # so bgpd is not overloaded
+    DEF_MAX_WORKERS = 8
+
+    # wait at most 30 seconds for fpmsyncd to consume the eoiu markers, only for the timeline
+    DEF_CONSUME_TIME_OUT = 30
+    CONSUME_CHECK_INTERVAL = 0.1
+
+    DEFAULT_VRF = "default"
+
+    # afi/safi key in bgp summary and eor key in bgp neighbors of each family
+    FAMILY_AFI_SAFI = {"IPv4": ("ipv4Unicast", "IPv4 Unicast"),
+                       "IPv6": ("ipv6Unicast", "IPv6 Unicast")}
+
+    # state_db is a redis client of the database the markers are written to, stateDB by default
+    def __init__(self, vtysh='vtysh', bulk_query=True, max_workers=DEF_MAX_WORKERS, state_db=None):
+        self.vtysh = vtysh
+        self.bulk_query = bulk_query
+        self.max_workers = max_workers
+        self.pool = None
+        # one stateDB connection is kept for all the marker updates
+        self.db = None
+        if state_db is None:
+            self.db = swsssdk.SonicV2Connector(host='127.0.0.1')
+            self.db.connect(self.db.STATE_DB, False)
+            state_db = self.db.get_redis_client(self.db.STATE_DB)
+        self.state_db = state_db
         self.ipv4_neighbors = []
         self.ipv4_neigh_eor_status = {}
         self.ipv6_neighbors = []
         self.ipv6_neigh_eor_status = {}
+        # neighbors are identified by (vrf, neigh address)
         self.keepalivesRecvCnt = {}
+        self.neigh_bgp_state = {}
+        # check interval and next check time of each ((vrf, neigh), is_ipv4)
+        self.check_interval = {}
+        self.next_check = {}
+        # check interval and next check time of the bulk query
+        self.bulk_check_interval = None
+        self.next_bulk_check = 0
         self.bgp_ipv4_eoiu = False
         self.bgp_ipv6_eoiu = False
         self.get_peers_wt = self.DEF_TIME_OUT
+        self.start_time = time.time()
+        self.start_timestamp = strftime("%Y-%m-%d %H:%M:%S", gmtime())
+        self.timeline = []
+
+    # Record a phase in the timeline with the elapsed milliseconds since the start
+    def record_phase(self, phase, detail=""):
+        elapsed = int((time.time() - self.start_time) * 1000)
+        self.timeline.append({'phase': phase, 'detail': detail, 'elapsed': elapsed})
+        return elapsed
+
+    # Save the phases to statedb "BGP_STATE_TABLE|timeline", eor of each neighbor is not saved here
+    # as it is already in "BGP_NEIGH_EOR_TABLE|family|neighbor".
+    def save_timeline(self, timeline_file=None):
+        fvs = {'start': self.start_timestamp}
+        for entry in self.timeline:
+            if entry['phase'] != 'eor':
+                name = entry['phase'] if not entry['detail'] else "%s|%s" % (entry['phase'], entry['detail'])
+                fvs[name] = entry['elapsed']
+        client = self.state_db
+        pipe = client.pipeline(transaction=True)
+        pipe.delete("BGP_STATE_TABLE|timeline")
+        pipe.hmset("BGP_STATE_TABLE|timeline", fvs)
+        pipe.execute()
+
+        if timeline_file:
+            with open(timeline_file, 'w') as f:
+                json.dump({'start': self.start_timestamp, 'timeline': self.timeline}, f, indent=4)
+        return
+
+    # Run a vtysh show command and return its parsed json output
+    def vtysh_json(self, cmd):
+        output = commands.getoutput("%s -c '%s'" % (self.vtysh, cmd))
+        return json.loads(output)
+
+    # Return {vrf -> output of show bgp summary json} from show bgp vrf all summary json.
+    # Output without vrf level, e.g. recorded from show bgp summary json, is taken as the default vrf.
+    def get_vrf_summary(self):
+        summary = self.vtysh_json('show bgp vrf all summary json')
+        if any(afi_safi in summary for afi_safi, _ in self.FAMILY_AFI_SAFI.values()):
+            return {self.DEFAULT_VRF: summary}
+        return summary
 
     def get_all_peers(self):
-        while self.get_peers_wt >= 0:
+        deadline = time.time() + self.get_peers_wt
+        retry_interval = self.PEERS_RETRY_INTERVAL
+        while True:
             try:
-                cmd = "vtysh -c 'show bgp summary json'"
-                output = commands.getoutput(cmd)
-                peer_info = json.loads(output)
-                if "ipv4Unicast" in peer_info and "peers" in peer_info["ipv4Unicast"]:
-                    self.ipv4_neighbors = peer_info["ipv4Unicast"]["peers"].keys()
-
-                if "ipv6Unicast" in peer_info and "peers" in peer_info["ipv6Unicast"]:
-                    self.ipv6_neighbors = peer_info["ipv6Unicast"]["peers"].keys()
+                vrf_summary = self.get_vrf_summary()
+                ipv4_neighbors = []
+                ipv6_neighbors = []
+                for vrf, peer_info in vrf_summary.items():
+                    afi_safi = self.FAMILY_AFI_SAFI["IPv4"][0]
+                    if afi_safi in peer_info and "peers" in peer_info[afi_safi]:
+                        ipv4_neighbors += [(vrf, neigh) for neigh in peer_info[afi_safi]["peers"].keys()]
+
+                    afi_safi = self.FAMILY_AFI_SAFI["IPv6"][0]
+                    if afi_safi in peer_info and "peers" in peer_info[afi_safi]:
+                        ipv6_neighbors += [(vrf, neigh) for neigh in peer_info[afi_safi]["peers"].keys()]
+                self.ipv4_neighbors = ipv4_neighbors
+                self.ipv6_neighbors = ipv6_neighbors
 
                 syslog.syslog('BGP ipv4 neighbors: {}'.format(self.ipv4_neighbors))
-                syslog.syslog('BGP ipv4 neighbors: {}'.format(self.ipv6_neighbors))
+                syslog.syslog('BGP ipv6 neighbors: {}'.format(self.ipv6_neighbors))
+                self.record_phase('peers_discovered')
                 return
 
             except Exception:
                 syslog.syslog(syslog.LOG_ERR, "*ERROR* get_all_peers Exception: %s" % (traceback.format_exc()))
-                time.sleep(5)
-                self.get_peers_wt -= 5
-                self.get_all_peers()
-        syslog.syslog(syslog.LOG_ERR, "Failed to get bgp neighbor info in {} seconds, exiting".format(self.DEF_TIME_OUT));
+
+            if time.time() + retry_interval > deadline:
+                break
+            time.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, self.MAX_PEERS_RETRY_INTERVAL)
+
+        syslog.syslog(syslog.LOG_ERR, "Failed to get bgp neighbor info in {} seconds, exiting".format(self.get_peers_wt));
         sys.exit(1)
 
     def init_peers_eor_status(self):
@@ -75,99 +191,263 @@ class BgpStateCheck():
             self.ipv4_neigh_eor_status[neigh] = "unknown"
         for neigh in self.ipv6_neighbors:
             self.ipv6_neigh_eor_status[neigh] = "unknown"
+        self.set_bgp_neigh_eor_state("IPv4", self.ipv4_neighbors, "unknown")
+        self.set_bgp_neigh_eor_state("IPv6", self.ipv6_neighbors, "unknown")
 
     # Set the statedb "BGP_STATE_TABLE|eoiu", so fpmsyncd can get the bgp eoiu signal
     # Only two families: 'ipv4' and 'ipv6'
-    # state is "unknown" / "reached" / "consumed"
-    def set_bgp_eoiu_marker(self, family, state):
-        db = swsssdk.SonicV2Connector(host='127.0.0.1')
-        db.connect(db.STATE_DB, False)
-        key = "BGP_STATE_TABLE|%s|eoiu" % family
-        db.set(db.STATE_DB, key, 'state', state)
+    # state is "unknown" / "reached"
+    # state and timestamp of all the given families are written in one MULTI/EXEC transaction,
+    # so fpmsyncd never sees a half-written marker. consumed_at of a previous marker is removed.
+    def set_bgp_eoiu_marker(self, families, state):
         timesamp = strftime("%Y-%m-%d %H:%M:%S", gmtime())
-        db.set(db.STATE_DB, key, 'timestamp', timesamp)
-        db.close(db.STATE_DB)
+        pipe = self.state_db.pipeline(transaction=True)
+        for family in families:
+            key = "BGP_STATE_TABLE|%s|eoiu" % family
+            pipe.hmset(key, {'state': state, 'timestamp': timesamp})
+            pipe.hdel(key, 'consumed_at')
+        pipe.execute()
+        for family in families:
+            self.record_phase(state, family)
+        return
+
+    # Wait for fpmsyncd to set consumed_at of the given families' markers, only to record it in the timeline
+    def wait_for_bgp_eoiu_consumed(self, families, timeout=DEF_CONSUME_TIME_OUT):
+        client = self.state_db
+        pending = list(families)
+        wait_time = timeout
+        while pending and wait_time >= 0:
+            for family in list(pending):
+                if client.hget("BGP_STATE_TABLE|%s|eoiu" % family, 'consumed_at'):
+                    self.record_phase('consumed', family)
+                    pending.remove(family)
+            if pending:
+                time.sleep(self.CONSUME_CHECK_INTERVAL)
+                wait_time -= self.CONSUME_CHECK_INTERVAL
+        if pending:
+            syslog.syslog(syslog.LOG_WARNING, "BGP eoiu marker not consumed for: {}".format(pending))
         return
 
     def clean_bgp_eoiu_marker(self):
-        db = swsssdk.SonicV2Connector(host='127.0.0.1')
-        db.connect(db.STATE_DB, False)
-        db.delete(db.STATE_DB, "BGP_STATE_TABLE|IPv4|eoiu")
-        db.delete(db.STATE_DB, "BGP_STATE_TABLE|IPv6|eoiu")
-        db.close(db.STATE_DB)
+        client = self.state_db
+        client.delete("BGP_STATE_TABLE|IPv4|eoiu", "BGP_STATE_TABLE|IPv6|eoiu")
         syslog.syslog('Cleaned ipv4 and ipv6 eoiu marker flags')
         return
 
-    def bgp_eor_received(self, neigh, is_ipv4):
+    # Set the statedb "BGP_NEIGH_EOR_TABLE|family|vrf|neighbor" of the given (vrf, neigh) neighbors
+    # state is "unknown" / "rcvd"
+    # elapsed is the milliseconds since the start when the state is set
+    def set_bgp_neigh_eor_state(self, family, neighs, state):
+        if not neighs:
+            return
+        timesamp = strftime("%Y-%m-%d %H:%M:%S", gmtime())
+        pipe = self.state_db.pipeline(transaction=False)
+        for vrf, neigh in neighs:
+            key = "BGP_NEIGH_EOR_TABLE|%s|%s|%s" % (family, vrf, neigh)
+            elapsed = self.record_phase('eor', "%s|%s|%s" % (family, vrf, neigh)) if state == "rcvd" else 0
+            pipe.hmset(key, {'state': state, 'timestamp': timesamp, 'elapsed': elapsed})
+        pipe.execute()
+        return
+
+    def clean_bgp_neigh_eor_state(self):
+        client = self.state_db
+        keys = client.keys("BGP_NEIGH_EOR_TABLE|*")
+        if keys:
+            client.delete(*keys)
+        return
+
+    def close_db(self):
+        if self.db:
+            self.db.close(self.db.STATE_DB)
+
+    # Index the neighbors in the output of show bgp [vrf V] neighbors json by (vrf, neigh)
+    def index_neigh_status(self, vrf, neig_status, neigh_index):
+        for neigh, status in neig_status.items():
+            # skip "vrfId", "vrfName" which are not neighbors
+            if isinstance(status, dict):
+                neigh_index[(vrf, neigh)] = status
+
+    # Fetch the status of all neighbors of all vrfs with a single query
+    def get_all_neigh_status(self):
+        neigh_index = {}
+        try:
+            vrf_status = self.vtysh_json('show bgp vrf all neighbors json')
+            if any(isinstance(status, dict) and "bgpState" in status for status in vrf_status.values()):
+                # output without vrf level is taken as the default vrf
+                self.index_neigh_status(self.DEFAULT_VRF, vrf_status, neigh_index)
+            else:
+                for vrf, neig_status in vrf_status.items():
+                    if isinstance(neig_status, dict):
+                        self.index_neigh_status(vrf, neig_status, neigh_index)
+        except Exception:
+            syslog.syslog(syslog.LOG_ERR, "*ERROR* get_all_neigh_status Exception: %s" % (traceback.format_exc()))
+        return neigh_index
+
+    # Fetch the status of one (vrf, neigh) neighbor, return {} if failed
+    def get_neigh_status(self, neigh_id):
+        vrf, neigh = neigh_id
+        neigh_index = {}
+        try:
+            if vrf == self.DEFAULT_VRF:
+                neig_status = self.vtysh_json("show bgp neighbors %s json" % neigh)
+            else:
+                neig_status = self.vtysh_json("show bgp vrf %s neighbors %s json" % (vrf, neigh))
+            self.index_neigh_status(vrf, neig_status, neigh_index)
+        except Exception:
+            syslog.syslog(syslog.LOG_ERR, "*ERROR* get_neigh_status Exception: %s" % (traceback.format_exc()))
+        return neigh_index
+
+    # Fetch the status of the given (vrf, neigh) neighbors one by one, each neighbor is queried once
+    # even if it is pending for both families. The queries are spread over a pool of max_workers
+    # threads so the neighbors are probed concurrently.
+    def get_neighs_status(self, neigh_ids):
+        neigh_index = {}
+        if self.max_workers <= 1 or len(neigh_ids) <= 1:
+            results = [self.get_neigh_status(neigh_id) for neigh_id in neigh_ids]
+        else:
+            if self.pool is None:
+                self.pool = ThreadPool(self.max_workers)
+            results = self.pool.map(self.get_neigh_status, neigh_ids)
+        for result in results:
+            neigh_index.update(result)
+        return neigh_index
+
+    # neigh_index is the status of the neighbors indexed by (vrf, neigh)
+    def bgp_eor_received(self, neigh_id, is_ipv4, neigh_index):
         try:
-            neighstr = "%s" % neigh
             eor_received = False
-            cmd = "vtysh -c 'show bgp neighbors %s json'" % neighstr
-            output = commands.getoutput(cmd)
-            neig_status = json.loads(output)
-            if neighstr in neig_status:
-                if "gracefulRestartInfo" in neig_status[neighstr]:
-                    if "endOfRibRecv" in neig_status[neighstr]["gracefulRestartInfo"]:
-                        eor_info = neig_status[neighstr]["gracefulRestartInfo"]["endOfRibRecv"]
-                        if is_ipv4 and "IPv4 Unicast" in eor_info and eor_info["IPv4 Unicast"] == True:
-                            eor_received = True
-                        elif not is_ipv4 and "IPv6 Unicast" in eor_info and eor_info["IPv6 Unicast"] == True:
+            if neigh_id in neigh_index:
+                neig_status = neigh_index[neigh_id]
+                self.neigh_bgp_state[neigh_id] = neig_status.get("bgpState")
+                if "gracefulRestartInfo" in neig_status:
+                    if "endOfRibRecv" in neig_status["gracefulRestartInfo"]:
+                        eor_info = neig_status["gracefulRestartInfo"]["endOfRibRecv"]
+                        eor_key = self.FAMILY_AFI_SAFI["IPv4" if is_ipv4 else "IPv6"][1]
+                        if eor_key in eor_info and eor_info[eor_key] == True:
                             eor_received = True
                 if eor_received:
-                    syslog.syslog('BGP eor received for neighbors: {}'.format(neigh))
+                    syslog.syslog('BGP eor received for neighbors: {}'.format(neigh_id))
 
                 # No explict eor, try implicit eor
-                if eor_received == False and "bgpState" in neig_status[neighstr] and neig_status[neighstr]["bgpState"] == "Established":
-                    # if "messageStats" in neig_status and "keepalivesRecv" in neig_status["messageStats"]:
+                if eor_received == False and "bgpState" in neig_status and neig_status["bgpState"] == "Established":
                     # it looks we need to record the keepalivesRecv count for detecting count change
-                    if neighstr not in self.keepalivesRecvCnt:
-                        self.keepalivesRecvCnt[neighstr] = neig_status[neighstr]["messageStats"]["keepalivesRecv"]
+                    if neigh_id not in self.keepalivesRecvCnt:
+                        self.keepalivesRecvCnt[neigh_id] = neig_status["messageStats"]["keepalivesRecv"]
                     else:
-                        eor_received = (self.keepalivesRecvCnt[neighstr] is not neig_status[neighstr]["messageStats"]["keepalivesRecv"])
+                        eor_received = (self.keepalivesRecvCnt[neigh_id] != neig_status["messageStats"]["keepalivesRecv"])
                         if eor_received:
-                            syslog.syslog('BGP implicit eor received for neighbors: {}'.format(neigh))
+                            syslog.syslog('BGP implicit eor received for neighbors: {}'.format(neigh_id))
 
             return eor_received
 
         except Exception:
             syslog.syslog(syslog.LOG_ERR, "*ERROR* bgp_eor_received Exception: %s" % (traceback.format_exc()))
 
+    # Schedule the next check of a neighbor which has no eor yet, based on its bgp state.
+    # An Established neighbor is expected to send eor soon, check it quickly. Otherwise
+    # the session is still in Idle/Connect/Active/OpenSent, back off to save cpu of bgpd.
+    def schedule_next_check(self, neigh, is_ipv4, now):
+        if self.neigh_bgp_state.get(neigh) == "Established":
+            interval = self.MIN_CHECK_INTERVAL
+        else:
+            interval = min(self.check_interval.get((neigh, is_ipv4), self.MIN_CHECK_INTERVAL / 2) * 2,
+                           self.MAX_CHECK_INTERVAL)
+        self.check_interval[(neigh, is_ipv4)] = interval
+        self.next_check[(neigh, is_ipv4)] = now + interval
+
+    # Schedule the next bulk query while the given (neigh, is_ipv4) are still pending, at the
+    # old fixed rate if any of them is Established, otherwise with a backoff.
+    def schedule_next_bulk_check(self, pending, now):
+        if any(self.neigh_bgp_state.get(neigh) == "Established" for neigh, _ in pending):
+            interval = self.BULK_CHECK_INTERVAL
+        else:
+            interval = min((self.bulk_check_interval or self.BULK_CHECK_INTERVAL / 2.0) * 2, self.MAX_CHECK_INTERVAL)
+        self.bulk_check_interval = interval
+        self.next_bulk_check = now + interval
 
     # This function is to collect eor state based on the saved ipv4_neigh_eor_status and ipv6_neigh_eor_status dictionaries
     # It iterates through the dictionary, and check whether the specific neighbor has EOR received.
     # EOR may be explicit EOR (End-Of-RIB) or an implicit-EOR.
     # The first keep-alive after BGP has reached Established is considered an implicit-EOR.
     #
-    # ipv4 and ipv6 neighbors are processed separately.
+    # ipv4 and ipv6 neighbors are tracked separately.
     # Once all ipv4 neighbors have EOR received, bgp_ipv4_eoiu becomes True.
     # Once all ipv6 neighbors have EOR received, bgp_ipv6_eoiu becomes True.
 
-    # The neighbor EoR states were checked in a loop with an interval (CHECK_INTERVAL)
+    # The neighbor EoR states were checked in a loop. In bulk_query mode, the status of all neighbors is fetched
+    # once per check at the interval of schedule_next_bulk_check, otherwise each neighbor is fetched at its own
+    # interval (schedule_next_check). Either way the status is indexed once and shared by both families.
     # The function will timeout in case eoiu states never meet the condition
     # after some time (DEF_TIME_OUT).
     def wait_for_bgp_eoiu(self):
-        wait_time = self.DEF_TIME_OUT
-        while wait_time >= 0:
+        deadline = time.time() + self.DEF_TIME_OUT
+        while True:
+            now = time.time()
+            pending = []
             if not self.bgp_ipv4_eoiu:
-                for neigh, eor_status in self.ipv4_neigh_eor_status.items():
-                    if eor_status == "unknown" and self.bgp_eor_received(neigh, True):
-                        self.ipv4_neigh_eor_status[neigh] = "rcvd"
-                if "unknown" not in self.ipv4_neigh_eor_status.values():
-                    self.bgp_ipv4_eoiu = True
-                    syslog.syslog("BGP ipv4 eoiu reached")
-
+                pending += [(neigh, True) for neigh, eor_status in self.ipv4_neigh_eor_status.items() if eor_status == "unknown"]
             if not self.bgp_ipv6_eoiu:
-                for neigh, eor_status in self.ipv6_neigh_eor_status.items():
-                    if eor_status == "unknown" and self.bgp_eor_received(neigh, False):
+                pending += [(neigh, False) for neigh, eor_status in self.ipv6_neigh_eor_status.items() if eor_status == "unknown"]
+            neigh_families = [neigh_family for neigh_family in pending if self.next_check.get(neigh_family, 0) <= now]
+
+            neigh_index = {}
+            if self.bulk_query:
+                # the bulk status covers all the pending neighbors at no extra cost
+                neigh_families = pending if pending and self.next_bulk_check <= now else []
+                if neigh_families:
+                    neigh_index = self.get_all_neigh_status()
+            elif neigh_families:
+                neigh_index = self.get_neighs_status(list(set(neigh for neigh, _ in neigh_families)))
+
+            eor_results = [self.bgp_eor_received(neigh, is_ipv4, neigh_index) for neigh, is_ipv4 in neigh_families]
+            ipv4_rcvd = []
+            ipv6_rcvd = []
+            now = time.time()
+            for (neigh, is_ipv4), eor_received in zip(neigh_families, eor_results):
+                if not eor_received:
+                    if not self.bulk_query:
+                        self.schedule_next_check(neigh, is_ipv4, now)
+                else:
+                    if is_ipv4:
+                        self.ipv4_neigh_eor_status[neigh] = "rcvd"
+                        ipv4_rcvd.append(neigh)
+                    else:
                         self.ipv6_neigh_eor_status[neigh] = "rcvd"
-                if "unknown" not in self.ipv6_neigh_eor_status.values():
-                    self.bgp_ipv6_eoiu = True
-                    syslog.syslog('BGP ipv6 eoiu reached')
+                        ipv6_rcvd.append(neigh)
+            self.set_bgp_neigh_eor_state("IPv4", ipv4_rcvd, "rcvd")
+            self.set_bgp_neigh_eor_state("IPv6", ipv6_rcvd, "rcvd")
+            if self.bulk_query and neigh_families:
+                self.schedule_next_bulk_check([neigh_family for neigh_family, eor_received
+                                               in zip(neigh_families, eor_results) if not eor_received], now)
+
+            # Signal each family as soon as it converges, it does not wait for the other family
+            if not self.bgp_ipv4_eoiu and "unknown" not in self.ipv4_neigh_eor_status.values():
+                self.bgp_ipv4_eoiu = True
+                self.set_bgp_eoiu_marker(["IPv4"], "reached")
+                syslog.syslog("BGP ipv4 eoiu reached")
+
+            if not self.bgp_ipv6_eoiu and "unknown" not in self.ipv6_neigh_eor_status.values():
+                self.bgp_ipv6_eoiu = True
+                self.set_bgp_eoiu_marker(["IPv6"], "reached")
+                syslog.syslog('BGP ipv6 eoiu reached')
 
             if self.bgp_ipv6_eoiu and self.bgp_ipv4_eoiu:
                 break;
-            time.sleep(self.CHECK_INTERVAL)
-            wait_time -= self.CHECK_INTERVAL
+
+            # sleep until the next bulk query or neighbor is due
+            now = time.time()
+            if now >= deadline:
+                break
+            if self.bulk_query:
+                next_check = min(self.next_bulk_check, deadline)
+            else:
+                next_check = min([self.next_check.get(neigh_family, now) for neigh_family in pending] + [deadline])
+            time.sleep(max(next_check - now, 0))
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
 
         if not self.bgp_ipv6_eoiu:
             syslog.syslog(syslog.LOG_ERR, "BGP ipv6 eoiu not reached: {}".format(self.ipv6_neigh_eor_status));
@@ -175,18 +455,33 @@ class BgpStateCheck():
         if not self.bgp_ipv4_eoiu:
             syslog.syslog(syslog.LOG_ERR, "BGP ipv4 eoiu not reached: {}".format(self.ipv4_neigh_eor_status));
 
+        if not (self.bgp_ipv4_eoiu and self.bgp_ipv6_eoiu):
+            self.record_phase('timeout')
+
 def main():
 
+    parser = argparse.ArgumentParser(description='Populate bgp eoiu marker flags in stateDB during warm reboot')
+    parser.add_argument('--vtysh', default='vtysh',
+                        help='vtysh command, may be a stand-in printing recorded json output')
+    parser.add_argument('--per-neighbor', action='store_true', default=False,
+                        help='query bgp neighbors one by one instead of one bulk query per check')
+    parser.add_argument('--workers', type=int, default=BgpStateCheck.DEF_MAX_WORKERS,
+                        help='max number of concurrent vtysh queries with --per-neighbor')
+    parser.add_argument('--timeline-file', default=None,
+                        help='also dump the recorded timeline to this json file')
+    args = parser.parse_args()
+
     print "bgp_eoiu_marker service is started"
 
     try:
-        bgp_state_check = BgpStateCheck()
+        bgp_state_check = BgpStateCheck(args.vtysh, not args.per_neighbor, args.workers)
     except Exception, e:
-        syslog.syslog(syslog.LOG_ERR, "{}: error exit 1, reason {}".format(THIS_MODULE, str(e)))
+        syslog.syslog(syslog.LOG_ERR, "bgp_eoiu_marker: error exit 1, reason {}".format(str(e)))
         exit(1)
 
-    # Always clean the eoiu marker in stateDB first
+    # Always clean the eoiu marker and neighbor eor states in stateDB first
     bgp_state_check.clean_bgp_eoiu_marker()
+    bgp_state_check.clean_bgp_neigh_eor_state()
 
     # Use warmstart python binding to check warmstart information
     warmstart = swsscommon.WarmStart()
@@ -195,24 +490,28 @@ def main():
 
     # if bgp or system warm reboot not enabled, don't run
     if not warmstart.isWarmStart():
+        bgp_state_check.close_db()
         print "bgp_eoiu_marker service is skipped as warm restart not enabled"
         return
 
-    bgp_state_check.set_bgp_eoiu_marker("IPv4", "unknown")
-    bgp_state_check.set_bgp_eoiu_marker("IPv6", "unknown")
+    bgp_state_check.set_bgp_eoiu_marker(["IPv4", "IPv6"], "unknown")
     bgp_state_check.get_all_peers()
     bgp_state_check.init_peers_eor_status()
+    # the eoiu marker of each family is set in statedb to signal other processes like fpmsyncd
+    # as soon as the family reaches eoiu
     try:
         bgp_state_check.wait_for_bgp_eoiu()
     except Exception as e:
         syslog.syslog(syslog.LOG_ERR, str(e))
         sys.exit(1)
 
-    # set statedb to signal other processes like fpmsynd
-    if bgp_state_check.bgp_ipv4_eoiu:
-        bgp_state_check.set_bgp_eoiu_marker("IPv4", "reached")
-    if bgp_state_check.bgp_ipv6_eoiu:
-        bgp_state_check.set_bgp_eoiu_marker("IPv6", "reached")
+    # fpmsyncd only consumes the markers when both families reached eoiu
+    if bgp_state_check.bgp_ipv4_eoiu and bgp_state_check.bgp_ipv6_eoiu:
+        bgp_state_check.wait_for_bgp_eoiu_consumed(["IPv4", "IPv6"])
+    bgp_state_check.record_phase('done')
+    bgp_state_check.save_timeline(args.timeline_file)
+
+    bgp_state_check.close_db()
 
     print "bgp_eoiu_marker service is done"
     return
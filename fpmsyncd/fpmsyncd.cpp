@@ -1,5 +1,6 @@
 #include <iostream>
 #include <inttypes.h>
+#include <time.h>
 #include "logger.h"
 #include "select.h"
 #include "selectabletimer.h"
@@ -44,6 +45,18 @@ static bool eoiuFlagsSet(Table &bgpStateTable)
     return true;
 }
 
+// Record when the eoiu flags are consumed, the "reached" state is left as is so that the
+// flags are detected again if the fpm connection is reestablished before reconciliation
+static void eoiuFlagsConsumed(Table &bgpStateTable)
+{
+    char timestamp[32];
+    time_t now = time(NULL);
+
+    strftime(timestamp, sizeof(timestamp), "%Y-%m-%d %H:%M:%S", gmtime(&now));
+    bgpStateTable.hset("IPv4|eoiu", "consumed_at", timestamp);
+    bgpStateTable.hset("IPv6|eoiu", "consumed_at", timestamp);
+}
+
 int main(int argc, char **argv)
 {
     swss::Logger::linkToDbNative("fpmsyncd");
@@ -163,6 +176,8 @@ int main(int argc, char **argv)
                             eoiuHoldTimer.start();
                             s.addSelectable(&eoiuHoldTimer);
                             SWSS_LOG_NOTICE("Warm-Restart started EOIU hold timer which is to expire in %" PRIuMAX " seconds.", eoiuHoldIval);
+                            /* Mark the eoiu flags as consumed, so bgp_eoiu_marker can record it */
+                            eoiuFlagsConsumed(bgpStateTable);
                             s.removeSelectable(&eoiuCheckTimer);
                             continue;
                         }
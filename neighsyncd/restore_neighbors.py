@@ -10,15 +10,55 @@ Description: restore_neighbors.py -- restoring neighbor table into kernel during
     through netlink API calls and update the neighbor table in kernel by sending arp/ns requests
     to all neighbor entries, then it sets the stateDB flag for neighsyncd to continue the
     reconciliation process.
+
+    The neighbors are installed into kernel with batched netlink requests, many RTM_NEWNEIGH messages
+    per send and the acks collected while the next batch is sent. --no-netlink-batch falls back to
+    one pyroute2 request per neighbor.
+
+    The arp/ns packets are built from one template per interface and family, only the target
+    address, multicast mac and checksum are patched per neighbor, and sent over a raw AF_PACKET
+    socket. Scapy is used if the raw socket is not available or with --scapy-probes.
+
+    By default the interfaces' states are checked every 5 seconds. With --event-driven, the neighbors of
+    an interface are restored as soon as it becomes ready, on netlink link/address events and stateDB
+    VLAN_MEMBER_TABLE keyspace notifications.
+
+    The interfaces are restored concurrently by a pool of --workers threads, each interface with its
+    own netlink and packet sockets. The arp/ns packets of all the workers share one token bucket, its
+    rate and burst are the cir and cbs of the CoPP group trapping arp/nd (COPP_TABLE in appDB, or
+    00-copp.config.json loaded by swssconfig), or --probe-rate, so the replies are not dropped by the
+    CoPP policer. The neighbors which are not reachable --probe-retry-delay ms after their probe are
+    probed again, up to --probe-retries times.
+
+    With --verify, the restored neighbors are checked against one kernel neighbor dump before the
+    restore is flagged done. The ones still stale or incomplete are probed again, --verify-budget
+    probes at most, and the reachable ratio from a second dump is written to the stats.
+
+    The restore counters and timings are written to stateDB NEIGH_RESTORE_TABLE|Stats and
+    NEIGH_RESTORE_INTF_TABLE|<intf>. The per neighbor entry logs can be turned off with --no-entry-log.
+
+    The neighbor table is read from appDB with SCAN and pipelined HGETALL in batches, or with one
+    server side lua dump with --lua-dump. The neighbors are kept per interface and family in a
+    NeighList, the packed addresses and macs in one bytearray, which are used as they are by the
+    netlink batches and the arp/ns templates.
 """
 
 import sys
+import argparse
+import socket
+import struct
+import json
+import select
+import threading
 import swsssdk
 import netifaces
 import time
 import monotonic
+from time import gmtime, strftime
+from multiprocessing.pool import ThreadPool
 from pyroute2 import IPRoute, NetlinkError
 from pyroute2.netlink.rtnl import ndmsg
+from pyroute2.netlink.rtnl import RTMGRP_LINK, RTMGRP_IPV4_IFADDR, RTMGRP_IPV6_IFADDR
 from socket import AF_INET,AF_INET6
 import logging
 logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
@@ -48,6 +88,9 @@ def log_error(msg):
     syslog.syslog(syslog.LOG_ERR, msg)
     syslog.closelog()
 
+# log every neighbor entry installed and probed, turned off by --no-entry-log
+log_entries = True
+
 # timeout the restore process in 110 seconds if not finished
 # This is mostly to wait for interfaces to be created and up after system warm-reboot
 # and this process is started by supervisord in swss docker.
@@ -58,15 +101,90 @@ DEF_TIME_OUT = 110
 # every 5 seconds to check interfaces states
 CHECK_INTERVAL = 5
 
+# the first vlan is held for 15 seconds after it is up before its neighbors are restored
+VLAN_HOLD_TIME = 3 * CHECK_INTERVAL
+
+# in event driven mode, stateDB keyspace notifications are read every 0.1 seconds
+# while waiting for netlink events
+KEYSPACE_POLL_INTERVAL = 0.1
+
+# number of interfaces restored concurrently
+DEF_WORKERS = 4
+
+# arp/ns packets sent per second by all the workers, and the burst, when the CoPP
+# configuration has no meter for arp/nd
+DEF_PROBE_RATE = 600
+DEF_PROBE_BURST = 600
+
+# CoPP configuration loaded by swssconfig, used if COPP_TABLE is not yet in appDB
+COPP_CONFIG_FILE = '/etc/swss/config.d/00-copp.config.json'
+COPP_ARP_TRAP_IDS = ('arp_req', 'arp_resp', 'neigh_discovery')
+
+# neighbors not reachable 500 ms after their probe are probed again, 2 times at most
+DEF_PROBE_RETRY_DELAY = 500
+DEF_PROBE_RETRIES = 2
+
+# stale or incomplete neighbors probed again by the verification, at most
+DEF_VERIFY_BUDGET = 1000
+
 ip_family = {"IPv4": AF_INET, "IPv6": AF_INET6}
 
-# return the first ipv4/ipv6 address assigned on intf
+# netlink definitions for batched neighbor install, see linux/netlink.h and linux/neighbour.h
+NUD_INCOMPLETE = 0x01
+NUD_REACHABLE = 0x02
+NUD_STALE = 0x04
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+RTM_NEWNEIGH = 28
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+NDA_DST = 1
+NDA_LLADDR = 2
+NLMSG_HDR_FMT = '=LHHLL'
+NLMSG_HDR_LEN = struct.calcsize(NLMSG_HDR_FMT)
+
+# number of neighbor entries sent per netlink batch, at most one more batch is sent before its acks are read
+NETLINK_BATCH_SIZE = 1000
+NETLINK_RCVBUF_SIZE = 4 * 1024 * 1024
+
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_IPV6 = 0x86dd
+ARP_REQUEST = 1
+IPPROTO_ICMPV6 = 58
+ND_NEIGHBOR_SOLICIT = 135
+ND_OPT_SOURCE_LINKADDR = 1
+
+# number of neighbor entries read from appDB per SCAN and pipeline round trip
+READ_BATCH_SIZE = 1000
+
+# dump all the entries matching ARGV[1] in one call, returns [[key, [field1, value1, ...]], ...]
+NEIGH_TABLE_DUMP_LUA = """
+local entries = {}
+local cursor = "0"
+repeat
+    local res = redis.call('SCAN', cursor, 'MATCH', ARGV[1], 'COUNT', ARGV[2])
+    cursor = res[1]
+    for _, key in ipairs(res[2]) do
+        table.insert(entries, {key, redis.call('HGETALL', key)})
+    end
+until cursor == "0"
+return entries
+"""
+
+# return the first ipv4/ipv6 address assigned on intf, a global address is preferred as the link
+# local one comes up first, but cover link local address as well when it is the only one
 def first_ip_on_intf(intf, family):
     if intf in netifaces.interfaces():
         ipaddresses = netifaces.ifaddresses(intf)
-        if ip_family[family] in ipaddresses:
-            # cover link local address as well
-            return ipaddresses[ip_family[family]][0]['addr'].split("%")[0]
+        addrs = [address['addr'].split("%")[0] for address in ipaddresses.get(ip_family[family], [])]
+        for addr in addrs:
+            if not addr.lower().startswith(('fe8', 'fe9', 'fea', 'feb')):
+                return addr
+        if addrs:
+            return addrs[0]
     return None
 
 # check if the intf is operational up
@@ -82,7 +200,8 @@ def is_intf_oper_state_up(intf):
         return True
     return False
 
-def is_intf_up(intf, db):
+# check if the intf is operational up, and for vlan, its members are created
+def is_intf_ready(intf, db):
     if not is_intf_oper_state_up(intf):
          return False
     if 'Vlan' in intf:
@@ -91,19 +210,100 @@ def is_intf_up(intf, db):
         if key is None:
             log_info ("Vlan member is not yet created")
             return False
-        if is_intf_up.counter == 0:
-            time.sleep(3*CHECK_INTERVAL)
-            is_intf_up.counter = 1
         log_info ("intf {} is up".format(intf))
     return True
 
+def is_intf_up(intf, db):
+    if not is_intf_ready(intf, db):
+        return False
+    if 'Vlan' in intf and is_intf_up.counter == 0:
+        time.sleep(VLAN_HOLD_TIME)
+        is_intf_up.counter = 1
+    return True
+
+# yield (key, value) of the neigh table entries, keys are scanned and values are fetched
+# with pipelined HGETALL, batch_size entries per round trip
+def scan_neigh_table(client, batch_size=READ_BATCH_SIZE):
+    seen = set()
+    keys = []
+    # SCAN may return a key more than once, only take it once
+    for key in client.scan_iter(match='NEIGH_TABLE:*', count=batch_size):
+        if key in seen:
+            continue
+        seen.add(key)
+        keys.append(key)
+        if len(keys) >= batch_size:
+            for entry in hgetall_batch(client, keys):
+                yield entry
+            keys = []
+    for entry in hgetall_batch(client, keys):
+        yield entry
+
+def hgetall_batch(client, keys):
+    if not keys:
+        return []
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    return zip(keys, pipe.execute())
+
+# yield (key, value) of the neigh table entries, dumped by one lua script on redis server
+def dump_neigh_table(client, batch_size=READ_BATCH_SIZE):
+    seen = set()
+    for key, fvs in client.eval(NEIGH_TABLE_DUMP_LUA, 0, 'NEIGH_TABLE:*', batch_size):
+        if key in seen:
+            continue
+        seen.add(key)
+        yield key, dict(zip(fvs[0::2], fvs[1::2]))
+
+def mac_to_bytes(mac):
+    return mac.replace(':', '').decode('hex')
+
+def bytes_to_mac(mac):
+    return ':'.join('%02x' % ord(b) for b in mac)
+
+# Neighbors of one interface and family, packed in one bytearray as records of the binary
+# address (4 bytes for IPv4, 16 bytes for IPv6) followed by the 6 bytes mac. 100k neighbors
+# take about 2MB, instead of a python list and two strings per neighbor.
+class NeighList(object):
+    def __init__(self, family):
+        self.family = family
+        self.af = ip_family[family]
+        self.addr_len = 4 if self.af == AF_INET else 16
+        self.rec_len = self.addr_len + 6
+        self.data = bytearray()
+
+    def __len__(self):
+        return len(self.data) // self.rec_len
+
+    def append(self, dst_ip, dmac):
+        dst, mac = inet_pton(self.af, dst_ip), mac_to_bytes(dmac)
+        if len(mac) != 6:
+            raise ValueError('Invalid mac address {}'.format(dmac))
+        self.data += dst + mac
+
+    def append_packed(self, dst, mac):
+        self.data += dst + mac
+
+    # yield (dst, mac) of the neighbors, packed
+    def __iter__(self):
+        data = str(self.data)
+        addr_len, rec_len = self.addr_len, self.rec_len
+        for offset in xrange(0, len(data), rec_len):
+            yield data[offset:offset + addr_len], data[offset + addr_len:offset + rec_len]
+
+    # yield (dst_ip, dmac) of the neighbors, as strings
+    def entries(self):
+        for dst, mac in self:
+            yield inet_ntop(self.af, dst), bytes_to_mac(mac)
+
 # read the neigh table from AppDB to memory, format as below
 # build map as below, this can efficiently access intf and family groups later
-#       { intf1 -> { { family1 -> [[ip1, mac1], [ip2, mac2] ...] }
-#                    { family2 -> [[ipM, macM], [ipN, macN] ...] } },
+#       { intf1 -> { { family1 -> NeighList([ip1, mac1], [ip2, mac2] ...) }
+#                    { family2 -> NeighList([ipM, macM], [ipN, macN] ...) } },
 #        ...
-#         intfA -> { { family1 -> [[ipW, macW], [ipX, macX] ...] }
-#                    { family2 -> [[ipY, macY], [ipZ, macZ] ...] } }
+#         intfA -> { { family1 -> NeighList([ipW, macW], [ipX, macX] ...) }
+#                    { family2 -> NeighList([ipY, macY], [ipZ, macZ] ...) } }
 #       }
 #
 # Alternatively:
@@ -117,10 +317,7 @@ def is_intf_up(intf, db):
 #  1, need iterate the whole list if only one family is up.
 #  2, need check interface state twice due to the split map
 
-def read_neigh_table_to_maps():
-    db = swsssdk.SonicV2Connector(host='127.0.0.1')
-    db.connect(db.APPL_DB, False)
-
+def neigh_entries_to_maps(entries):
     intf_neigh_map = {}
     # Key format: "NEIGH_TABLE:intf-name:ipv4/ipv6", examples below:
     # "NEIGH_TABLE:Ethernet122:100.1.1.200"
@@ -130,15 +327,15 @@ def read_neigh_table_to_maps():
     # 2) "00:22:33:44:55:cc"
     # 3) "family"
     # 4) "IPv4" or "IPv6"
-    keys = db.keys(db.APPL_DB, 'NEIGH_TABLE:*')
-    keys = [] if keys is None else keys
-    for key in keys:
+    for key, value in entries:
         key_split = key.split(':', 2)
         intf_name = key_split[1]
         if intf_name == 'lo':
             continue
+        # entry deleted after it was scanned
+        if not value:
+            continue
         dst_ip = key_split[2]
-        value = db.get_all(db.APPL_DB, key)
         if 'neigh' in value and 'family' in value:
             dmac = value['neigh']
             family = value['family']
@@ -149,26 +346,65 @@ def read_neigh_table_to_maps():
             raise RuntimeError('Neigh table format is incorrect')
 
         # build map like this:
-        #       { intf1 -> { { family1 -> [[ip1, mac1], [ip2, mac2] ...] }
-        #                    { family2 -> [[ipM, macM], [ipN, macN] ...] } },
+        #       { intf1 -> { { family1 -> NeighList([ip1, mac1], [ip2, mac2] ...) }
+        #                    { family2 -> NeighList([ipM, macM], [ipN, macN] ...) } },
         #         intfX -> {...}
         #       }
-        ip_mac_pair = []
-        ip_mac_pair.append(dst_ip)
-        ip_mac_pair.append(dmac)
+        family_neigh_map = intf_neigh_map.setdefault(intf_name, {})
+        if family not in family_neigh_map:
+            family_neigh_map[family] = NeighList(family)
+        try:
+            family_neigh_map[family].append(dst_ip, dmac)
+        except (ValueError, TypeError, socket.error):
+            raise RuntimeError('Neigh table format is incorrect')
+    return intf_neigh_map
+
+def read_neigh_table_to_maps(lua_dump=False):
+    db = swsssdk.SonicV2Connector(host='127.0.0.1')
+    db.connect(db.APPL_DB, False)
+    client = db.get_redis_client(db.APPL_DB)
 
-        intf_neigh_map.setdefault(intf_name, {}).setdefault(family, []).append(ip_mac_pair)
+    entries = dump_neigh_table(client) if lua_dump else scan_neigh_table(client)
+    intf_neigh_map = neigh_entries_to_maps(entries)
     db.close(db.APPL_DB)
     return intf_neigh_map
 
+# return (cir, cbs) of the CoPP group trapping arp/nd, from the COPP_TABLE entries, a list of
+# (key, fields), or None if the group has no packets meter
+def copp_arp_meter(entries):
+    for key, fields in entries:
+        trap_ids = fields.get('trap_ids', '').split(',')
+        if not any(trap_id in COPP_ARP_TRAP_IDS for trap_id in trap_ids):
+            continue
+        if fields.get('meter_type') != 'packets' or 'cir' not in fields:
+            return None
+        cir = int(fields['cir'])
+        return cir, int(fields.get('cbs', cir))
+    return None
+
+def read_copp_arp_meter(config_file=COPP_CONFIG_FILE):
+    db = swsssdk.SonicV2Connector(host='127.0.0.1')
+    db.connect(db.APPL_DB, False)
+    client = db.get_redis_client(db.APPL_DB)
+    entries = hgetall_batch(client, client.keys('COPP_TABLE:*'))
+    db.close(db.APPL_DB)
+    if not entries:
+        try:
+            with open(config_file) as f:
+                entries = [(key, fields) for item in json.load(f) for key, fields in item.items() if key != 'OP']
+        except (IOError, ValueError), e:
+            log_warning('Failed to read CoPP configuration {}: {}'.format(config_file, e))
+    return copp_arp_meter(entries)
 
 # Use netlink to set neigh table into kernel, not overwrite the existing ones
+# Returns True if the neighbor is added, False if it exists
 def set_neigh_in_kernel(ipclass, family, intf_idx, dst_ip, dmac):
-    log_info('Add neighbor entries: family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
-    family, intf_idx, dst_ip, dmac))
+    if log_entries:
+        log_info('Add neighbor entries: family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+        family, intf_idx, dst_ip, dmac))
 
     if family not in ip_family:
-        return
+        return False
 
     family_af_inet = ip_family[family]
     # Add neighbor to kernel with "stale" state, we will send arp/ns packet later
@@ -185,10 +421,96 @@ def set_neigh_in_kernel(ipclass, family, intf_idx, dst_ip, dmac):
     # If neigh exists, log it but no exception raise, other exceptions, raise
     except NetlinkError as e:
         if e[0] == errno.EEXIST:
-            log_warning('Neigh exists in kernel with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
-            family, intf_idx, dst_ip, dmac))
+            if log_entries:
+                log_warning('Neigh exists in kernel with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                family, intf_idx, dst_ip, dmac))
+            return False
         else:
             raise
+    return True
+
+def nlattr(attr_type, data):
+    length = 4 + len(data)
+    return struct.pack('=HH', length, attr_type) + data + '\0' * ((4 - length % 4) % 4)
+
+# Install neighbors into kernel with batched netlink RTM_NEWNEIGH requests.
+# Many requests are packed into one send buffer, the acks of a batch are read after
+# the next batch is sent, so the install is not bound by one round trip per neighbor.
+# Same as set_neigh_in_kernel, neighbors are added in "stale" state and the existing
+# ones are not overwritten, EEXIST is logged but not raised.
+class NeighBatchInstaller(object):
+    def __init__(self, batch_size=NETLINK_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            # SO_RCVBUFFORCE is not limited by rmem_max but needs CAP_NET_ADMIN
+            self.sock.setsockopt(socket.SOL_SOCKET, 33, NETLINK_RCVBUF_SIZE)
+        except socket.error:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, NETLINK_RCVBUF_SIZE)
+        self.sock.bind((0, 0))
+        self.seq = 0
+        # seq -> (family, intf_idx, dst, mac) of the requests not acked yet, packed
+        self.pending = {}
+        self.buf = []
+        self.installed = 0
+        self.exists = 0
+
+    def add(self, family, intf_idx, dst_ip, dmac):
+        self.add_packed(family, intf_idx, inet_pton(ip_family[family], dst_ip), mac_to_bytes(dmac))
+
+    # dst and mac are the packed address and mac
+    def add_packed(self, family, intf_idx, dst, mac):
+        af = ip_family[family]
+        self.seq += 1
+        body = struct.pack('=BBHiHBB', af, 0, 0, intf_idx, ndmsg.states['stale'], 0, 0)
+        body += nlattr(NDA_DST, dst)
+        body += nlattr(NDA_LLADDR, mac)
+        flags = NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL
+        self.buf.append(struct.pack(NLMSG_HDR_FMT, NLMSG_HDR_LEN + len(body), RTM_NEWNEIGH, flags, self.seq, 0) + body)
+        self.pending[self.seq] = (family, intf_idx, dst, mac)
+        if len(self.buf) >= self.batch_size:
+            self.send()
+
+    def send(self):
+        if self.buf:
+            self.sock.send(''.join(self.buf))
+            self.buf = []
+        # leave at most one batch in flight
+        self.read_acks(self.batch_size)
+
+    # read acks until at most max_pending requests are not acked
+    def read_acks(self, max_pending):
+        while len(self.pending) > max_pending:
+            data = self.sock.recv(NETLINK_RCVBUF_SIZE)
+            offset = 0
+            while offset + NLMSG_HDR_LEN <= len(data):
+                length, msg_type, _, seq, _ = struct.unpack_from(NLMSG_HDR_FMT, data, offset)
+                if length < NLMSG_HDR_LEN:
+                    break
+                if msg_type == NLMSG_ERROR and seq in self.pending:
+                    error = -struct.unpack_from('=i', data, offset + NLMSG_HDR_LEN)[0]
+                    family, intf_idx, dst, mac = self.pending.pop(seq)
+                    if error == 0:
+                        self.installed += 1
+                    elif error == errno.EEXIST:
+                        self.exists += 1
+                        if log_entries:
+                            log_warning('Neigh exists in kernel with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                            family, intf_idx, inet_ntop(ip_family[family], dst), bytes_to_mac(mac)))
+                    else:
+                        raise NetlinkError(error, 'Failed to add neighbor with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                        family, intf_idx, inet_ntop(ip_family[family], dst), bytes_to_mac(mac)))
+                offset += (length + 3) & ~3
+
+    # send the remaining requests and wait for all the acks
+    def flush(self):
+        if self.buf:
+            self.sock.send(''.join(self.buf))
+            self.buf = []
+        self.read_acks(0)
+
+    def close(self):
+        self.sock.close()
 
 # build ARP or NS packets depending on family
 def build_arp_ns_pkt(family, smac, src_ip, dst_ip):
@@ -206,6 +528,69 @@ def build_arp_ns_pkt(family, smac, src_ip, dst_ip):
         pkt = eth/ipv6/ns/ns_opt
     return pkt
 
+def csum_add(data):
+    return sum(struct.unpack('!%dH' % (len(data) / 2), data))
+
+def csum_fold(total):
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+# ARP or NS frame template of one interface and family, equivalent to build_arp_ns_pkt().
+# The frame is serialized once, build() only patches the target address, and for NS
+# the solicited-node multicast mac/ip and the icmpv6 checksum.
+class ArpNsTemplate(object):
+    def __init__(self, family, smac, src_ip):
+        self.family = family
+        smac = mac_to_bytes(smac)
+        if family == 'IPv4':
+            eth = '\xff' * 6 + smac + struct.pack('!H', ETH_P_ARP)
+            arp = struct.pack('!HHBBH', 1, ETH_P_IP, 6, 4, ARP_REQUEST)
+            arp += smac + inet_pton(AF_INET, src_ip) + '\0' * 6 + '\0' * 4
+            self.frame = bytearray(eth + arp)
+            # target protocol address
+            self.tpa_offset = len(eth) + 24
+        else:
+            src = inet_pton(AF_INET6, src_ip)
+            ns_len = 32
+            eth = '\x33\x33\xff\0\0\0' + smac + struct.pack('!H', ETH_P_IPV6)
+            ipv6 = struct.pack('!LHBB', 6 << 28, ns_len, IPPROTO_ICMPV6, 255) + src + inet_pton(AF_INET6, 'ff02::1:ff00:0')
+            opt = struct.pack('!BB', ND_OPT_SOURCE_LINKADDR, 1) + smac
+            ns = struct.pack('!BBHL', ND_NEIGHBOR_SOLICIT, 0, 0, 0) + '\0' * 16 + opt
+            self.frame = bytearray(eth + ipv6 + ns)
+            self.eth_dst_offset = 3
+            self.ip_dst_offset = len(eth) + 24
+            self.cksum_offset = len(eth) + len(ipv6) + 2
+            self.tgt_offset = len(eth) + len(ipv6) + 8
+            # checksum of the pseudo header and icmpv6 fields which do not change per neighbor
+            self.fixed_sum = csum_add(src) + csum_add(struct.pack('!LL', ns_len, IPPROTO_ICMPV6)) + \
+                             csum_add(struct.pack('!BBHL', ND_NEIGHBOR_SOLICIT, 0, 0, 0)) + csum_add(opt)
+
+    # dst is the packed target address
+    def build(self, dst):
+        frame = self.frame
+        if self.family == 'IPv4':
+            frame[self.tpa_offset:self.tpa_offset + 4] = dst
+        else:
+            mcast_dst = inet_pton(AF_INET6, 'ff02::1:ff00:0')[:13] + dst[13:]
+            frame[self.eth_dst_offset:self.eth_dst_offset + 3] = dst[13:]
+            frame[self.ip_dst_offset:self.ip_dst_offset + 16] = mcast_dst
+            frame[self.tgt_offset:self.tgt_offset + 16] = dst
+            cksum = csum_fold(self.fixed_sum + csum_add(mcast_dst) + csum_add(dst))
+            frame[self.cksum_offset:self.cksum_offset + 2] = struct.pack('!H', cksum)
+        return bytes(frame)
+
+# Open a raw AF_PACKET socket on intf to send the templated arp/ns frames,
+# return None if it is not available so scapy is used instead
+def open_raw_socket(intf):
+    try:
+        s = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        s.bind((intf, 0))
+        return s
+    except socket.error as e:
+        log_warning('Failed to open raw socket on {}: {}, use scapy instead'.format(intf, str(e)))
+        return None
+
 # Set the statedb "NEIGH_RESTORE_TABLE|Flags", so neighsyncd can start reconciliation
 def set_statedb_neigh_restore_done():
     db = swsssdk.SonicV2Connector(host='127.0.0.1')
@@ -214,6 +599,391 @@ def set_statedb_neigh_restore_done():
     db.close(db.STATE_DB)
     return
 
+RESTORE_COUNTERS = ('entries_read', 'installed', 'exists', 'probes_sent', 'probes_retried', 'probes_skipped',
+                    'verify_probes')
+
+# Counters and timings of the restore, in ms from the start of the restore service, shared by
+# the restore workers. Saved to stateDB, the counters in NEIGH_RESTORE_TABLE|Stats and the
+# per interface wait (from the start until its restore started) and elapsed time in
+# NEIGH_RESTORE_INTF_TABLE|<intf>.
+class RestoreStats(object):
+    def __init__(self):
+        self.start_time = time.time()
+        self.counters = dict.fromkeys(RESTORE_COUNTERS, 0)
+        self.timings = {}
+        self.results = {}
+        self.intfs = {}
+        self.lock = threading.Lock()
+
+    def elapsed(self, now=None):
+        return int(((now or time.time()) - self.start_time) * 1000)
+
+    def add(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                self.counters[name] += value
+
+    def record(self, timing):
+        self.timings[timing] = self.elapsed()
+
+    def set(self, **results):
+        with self.lock:
+            self.results.update(results)
+
+    def intf_restored(self, intf, start, neighbors, probes):
+        with self.lock:
+            self.intfs[intf] = {
+                'wait': self.elapsed(start),
+                'elapsed': int((time.time() - start) * 1000),
+                'neighbors': neighbors,
+                'probes_sent': probes,
+            }
+
+    def save(self):
+        db = swsssdk.SonicV2Connector(host='127.0.0.1')
+        db.connect(db.STATE_DB, False)
+        client = db.get_redis_client(db.STATE_DB)
+        with self.lock:
+            stats = dict(self.counters, **self.timings)
+            stats.update(self.results)
+            stats['elapsed'] = self.elapsed()
+            stats['timestamp'] = strftime("%Y-%m-%d %H:%M:%S", gmtime())
+            pipe = client.pipeline(transaction=True)
+            for key in client.keys('NEIGH_RESTORE_INTF_TABLE|*'):
+                pipe.delete(key)
+            pipe.hmset('NEIGH_RESTORE_TABLE|Stats', stats)
+            for intf, intf_stats in self.intfs.items():
+                pipe.hmset('NEIGH_RESTORE_INTF_TABLE|{}'.format(intf), intf_stats)
+            pipe.execute()
+        db.close(db.STATE_DB)
+        log_info('Neighbor restore stats: {}'.format(stats))
+
+# Send the arp/nd packets of one interface, built from ArpNsTemplate and sent over a raw socket,
+# or built and sent with scapy if the raw socket is not available or without raw_probes.
+# dst is the packed address, with pacer, each packet waits for a token of the global probe rate.
+# Past deadline, or if the token is only refilled after it, the packets are skipped and counted.
+class ProbeSender(object):
+    def __init__(self, intf, raw_probes=True, pacer=None, deadline=None):
+        self.src_mac = get_if_hwaddr(intf)
+        self.pacer = pacer
+        self.deadline = deadline
+        self.expired = False
+        self.sock = open_raw_socket(intf) if raw_probes else None
+        self.use_template = self.sock is not None
+        if not self.use_template:
+            self.sock = conf.L2socket(iface=intf)
+        # (family, src_ip) -> ArpNsTemplate
+        self.templates = {}
+        self.sent = 0
+        self.skipped = 0
+
+    def send(self, family, src_ip, dst):
+        if not self.expired and self.deadline is not None and time.time() >= self.deadline:
+            self.expired = True
+        if not self.expired and self.pacer and not self.pacer.wait(self.deadline):
+            self.expired = True
+        if self.expired:
+            self.skipped += 1
+            return
+        if self.use_template:
+            template = self.templates.get((family, src_ip))
+            if template is None:
+                template = self.templates[(family, src_ip)] = ArpNsTemplate(family, self.src_mac, src_ip)
+            self.sock.send(template.build(dst))
+        else:
+            self.sock.send(build_arp_ns_pkt(family, self.src_mac, src_ip, inet_ntop(ip_family[family], dst)))
+        self.sent += 1
+
+    def close(self):
+        self.sock.close()
+
+# Restore the neighbors of an up interface. For each family with ip address assigned on the
+# interface, the neighbors are set in kernel and arp/nd packets are sent to update them, then
+# the family is removed from intf_neigh_map, so is the interface once all families are restored.
+# With installer, the neighbors are installed in netlink batches before the arp/nd packets are sent.
+# With raw_probes, the arp/nd packets are sent from ArpNsTemplate over a raw socket.
+# With pacer, each arp/nd packet waits for a token of the global probe rate.
+# The neighbors not reachable retry_delay ms after the last probe on the interface are probed
+# again, up to retries times.
+# Past deadline, the neighbors are still set in kernel but no more probed nor retried.
+# With stats, the counters and timings of the interface are added to the RestoreStats.
+def restore_intf_neighbors(intf, intf_neigh_map, ipclass, installer=None, raw_probes=True, pacer=None,
+                           retries=0, retry_delay=DEF_PROBE_RETRY_DELAY, stats=None, deadline=None):
+    start = time.time()
+    counters = dict.fromkeys(RESTORE_COUNTERS, 0)
+    neighbors = 0
+    family_neigh_map = intf_neigh_map[intf]
+    intf_idx = ipclass.link_lookup(ifname=intf)[0]
+    # create socket per intf to send packets
+    sender = ProbeSender(intf, raw_probes, pacer, deadline)
+
+    # (family, src_ip, neigh_list) of the probed families, for retries
+    retry_queue = []
+    # Only two families: 'IPv4' and 'IPv6'
+    for family in ip_family.keys():
+        # if ip address assigned and if we have neighs in this family, restore them
+        src_ip = first_ip_on_intf(intf, family)
+        if src_ip and (family in family_neigh_map):
+            neigh_list = family_neigh_map[family]
+            neighbors += len(neigh_list)
+            if installer:
+                installed, exists = installer.installed, installer.exists
+                for dst, mac in neigh_list:
+                    installer.add_packed(family, intf_idx, dst, mac)
+                installer.flush()
+                counters['installed'] += installer.installed - installed
+                counters['exists'] += installer.exists - exists
+                log_info('Added {} neighbor entries: family: {}, intf_idx: {}'.format(
+                len(neigh_list), family, intf_idx))
+            for dst, mac in neigh_list:
+                # use netlink to set neighbor entries
+                if not installer:
+                    if set_neigh_in_kernel(ipclass, family, intf_idx, inet_ntop(ip_family[family], dst),
+                                           bytes_to_mac(mac)):
+                        counters['installed'] += 1
+                    else:
+                        counters['exists'] += 1
+
+                if log_entries:
+                    log_info('Sending Neigh with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
+                    family, intf_idx, inet_ntop(ip_family[family], dst), bytes_to_mac(mac)))
+                # sending arp/ns packet to update kernel neigh info
+                sender.send(family, src_ip, dst)
+            retry_queue.append((family, src_ip, neigh_list))
+            # delete this family on the intf
+            del intf_neigh_map[intf][family]
+
+    last_probe = time.time()
+    for retry in range(retries):
+        if not retry_queue or sender.expired:
+            break
+        retry_time = last_probe + retry_delay / 1000.0
+        if deadline is not None and retry_time >= deadline:
+            break
+        time.sleep(max(retry_time - time.time(), 0))
+        pending = []
+        for family, src_ip, neigh_list in retry_queue:
+            unreachable = unreachable_neighs(ipclass, family, intf_idx, neigh_list)
+            if not unreachable:
+                continue
+            log_info('Probing {} unreachable neighbors again: family: {}, intf_idx: {}, retry: {}'.format(
+            len(unreachable), family, intf_idx, retry + 1))
+            sent = sender.sent
+            for dst, mac in unreachable:
+                sender.send(family, src_ip, dst)
+            counters['probes_retried'] += sender.sent - sent
+            pending.append((family, src_ip, unreachable))
+        retry_queue = pending
+        last_probe = time.time()
+    # close the pkt socket
+    sender.close()
+    counters['probes_sent'] = sender.sent
+    counters['probes_skipped'] = sender.skipped
+    if sender.skipped:
+        log_warning('{} arp/nd packets not sent on {}, the restore timed out'.format(sender.skipped, intf))
+
+    if stats and neighbors:
+        stats.add(**counters)
+        stats.intf_restored(intf, start, neighbors, counters['probes_sent'])
+
+    # if all families are deleted, remove the key
+    if len(intf_neigh_map[intf]) == 0:
+        del intf_neigh_map[intf]
+
+# return a NeighList of the neighbors of neigh_list which are not reachable in kernel, from one
+# neighbor dump of the family on the interface
+def unreachable_neighs(ipclass, family, intf_idx, neigh_list):
+    af = ip_family[family]
+    reachable = set()
+    for neigh in ipclass.get_neighbours(family=af, ifindex=intf_idx):
+        if neigh['state'] & NUD_REACHABLE and neigh.get_attr('NDA_DST'):
+            reachable.add(inet_pton(af, neigh.get_attr('NDA_DST')))
+    unreachable = NeighList(family)
+    for dst, mac in neigh_list:
+        if dst not in reachable:
+            unreachable.append_packed(dst, mac)
+    return unreachable
+
+# Token bucket of the arp/nd packets of all the restore workers, refilled at rate tokens per
+# second up to burst tokens. Each caller takes a token, or reserves the next one and sleeps
+# until it is refilled. wait() returns False without a token if it is only refilled after deadline.
+class ProbeTokenBucket(object):
+    def __init__(self, rate=DEF_PROBE_RATE, burst=DEF_PROBE_BURST):
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self, deadline=None):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            delay = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+            if deadline is not None and now + delay > deadline:
+                return False
+            self.tokens -= 1
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+# Restore the interfaces concurrently, one interface per worker at a time. Each restore uses its
+# own netlink handle, netlink batch installer and packet socket, the probes share the token bucket.
+# An interface submitted while it is being restored is queued again once its restore is done, so
+# the families skipped for lack of an address are restored on the next event. If the restore of an
+# interface fails, its neighbors are dropped from intf_neigh_map so the caller does not wait for it,
+# and the error is raised again by close(). The probes and retries stop at deadline, so close() does
+# not wait much longer.
+class IntfRestorePool(object):
+    def __init__(self, intf_neigh_map, workers=DEF_WORKERS, pacer=None, netlink_batch=True, raw_probes=True,
+                 retries=0, retry_delay=DEF_PROBE_RETRY_DELAY, stats=None, deadline=None):
+        self.intf_neigh_map = intf_neigh_map
+        self.deadline = deadline
+        self.pacer = pacer
+        self.netlink_batch = netlink_batch
+        self.raw_probes = raw_probes
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.stats = stats
+        self.pool = ThreadPool(max(workers, 1))
+        self.pending = {}
+        # interfaces submitted again while they are being restored
+        self.resubmit = set()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def restore(self, intf):
+        try:
+            if intf in self.intf_neigh_map:
+                self.restore_intf(intf)
+        finally:
+            with self.lock:
+                if intf in self.resubmit:
+                    self.resubmit.remove(intf)
+                    if intf in self.intf_neigh_map and not self.closed:
+                        self.pending[intf] = self.pool.apply_async(self.restore, (intf,))
+
+    def restore_intf(self, intf):
+        ipclass = IPRoute()
+        installer = NeighBatchInstaller() if self.netlink_batch else None
+        try:
+            restore_intf_neighbors(intf, self.intf_neigh_map, ipclass, installer, self.raw_probes, self.pacer,
+                                   self.retries, self.retry_delay, self.stats, self.deadline)
+        except Exception, e:
+            log_error('Failed to restore neighbors on {}: {}'.format(intf, e))
+            self.intf_neigh_map.pop(intf, None)
+            raise
+        finally:
+            if installer:
+                installer.close()
+            ipclass.close()
+
+    def submit(self, intf):
+        with self.lock:
+            result = self.pending.get(intf)
+            if result is not None and not result.ready():
+                self.resubmit.add(intf)
+                return
+            self.pending[intf] = self.pool.apply_async(self.restore, (intf,))
+
+    # wait up to timeout, returns early only if all the interfaces are restored
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        for result in self.pending.values():
+            result.wait(max(deadline - time.time(), 0))
+            if not self.intf_neigh_map:
+                return
+        if self.intf_neigh_map:
+            time.sleep(max(deadline - time.time(), 0))
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.pool.close()
+        self.pool.join()
+        for result in self.pending.values():
+            result.get()
+
+# Token bucket of probe_rate and probe_burst, the CoPP arp/nd meter if not given
+def probe_token_bucket(probe_rate=None, probe_burst=None):
+    if probe_rate is None:
+        meter = read_copp_arp_meter() or (DEF_PROBE_RATE, DEF_PROBE_BURST)
+        log_info('Probe rate from CoPP arp/nd meter: cir {}, cbs {}'.format(meter[0], meter[1]))
+        probe_rate = meter[0]
+        probe_burst = probe_burst or meter[1]
+    return ProbeTokenBucket(probe_rate, probe_burst or probe_rate)
+
+# Warn if probing the entries at the rate of pacer, with the retry delays, takes longer than the
+# restore timeout. The probes and retries left at the timeout are skipped, the neighbors are only
+# set in kernel, and the restore is signaled done.
+def check_probe_time(entries, pacer, timeout, retries, retry_delay):
+    if pacer.rate <= 0 or not entries:
+        return
+    projected = entries / pacer.rate + retries * retry_delay / 1000.0
+    if projected > timeout:
+        log_warning('Probing {} neighbors at {} packets/s takes at least {:.0f} seconds, more than the '
+                    'restore timeout of {} seconds, the neighbors left are not probed, raise --probe-rate '
+                    'or the CoPP arp/nd meter'.format(
+                    entries, int(pacer.rate), projected, timeout))
+
+# Wait for the interfaces to become ready and restore their neighbors as soon as they are.
+# The interfaces are checked again on netlink link/address events, stateDB VLAN_MEMBER_TABLE
+# keyspace notifications, when the vlan hold time expires, and every CHECK_INTERVAL while some
+# neighbors are not restored. Instead of sleeping like is_intf_up, the first vlan is held
+# VLAN_HOLD_TIME after it is ready while the other interfaces go on.
+def restore_kernel_neighbors_on_events(intf_neigh_map, timeout, db, restore_intf):
+    deadline = time.time() + timeout
+    monitor = IPRoute()
+    monitor.bind(groups=RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR)
+    pubsub = db.get_redis_client(db.STATE_DB).pubsub()
+    pubsub.psubscribe('__keyspace@*__:VLAN_MEMBER_TABLE|*')
+    vlan_hold_until = None
+    vlan_hold_expired = False
+    recheck = True
+    last_check = 0
+    try:
+        while intf_neigh_map:
+            now = time.time()
+            if now >= deadline:
+                break
+            if vlan_hold_until is not None and not vlan_hold_expired and vlan_hold_until <= now:
+                vlan_hold_expired = True
+                recheck = True
+            # the families skipped by a restore, e.g. with no address yet, are retried periodically
+            if now - last_check >= CHECK_INTERVAL:
+                recheck = True
+
+            if recheck:
+                recheck = False
+                last_check = now
+                for intf in intf_neigh_map.keys():
+                    if not is_intf_ready(intf, db):
+                        continue
+                    if 'Vlan' in intf:
+                        if vlan_hold_until is None:
+                            vlan_hold_until = now + VLAN_HOLD_TIME
+                        if now < vlan_hold_until:
+                            continue
+                    restore_intf(intf)
+                continue
+
+            wait = min(KEYSPACE_POLL_INTERVAL, deadline - now, last_check + CHECK_INTERVAL - now)
+            if vlan_hold_until is not None and vlan_hold_until > now:
+                wait = min(wait, vlan_hold_until - now)
+            # drain all the pending netlink events, they only trigger one check
+            while select.select([monitor.fileno()], [], [], max(wait, 0))[0]:
+                monitor.get()
+                recheck = True
+                wait = 0
+            while pubsub.get_message():
+                recheck = True
+    finally:
+        pubsub.close()
+        monitor.close()
+
 # This function is to restore the kernel neighbors based on the saved neighbor map
 # It iterates through the map, and work on interface by interface basis.
 # If the interface is operational up and has IP configured per IP family,
@@ -221,57 +991,170 @@ def set_statedb_neigh_restore_done():
 # The restoring process is done by setting the neighbors in kernel from saved entries
 # first, then sending arp/nd packets to update the neighbors.
 # Once all the entries are restored, this function is returned.
-# The interfaces' states were checked in a loop with an interval (CHECK_INTERVAL)
+# The interfaces' states were checked in a loop with an interval (CHECK_INTERVAL),
+# or on interface events with event_driven (restore_kernel_neighbors_on_events).
 # The function will timeout in case interfaces' states never meet the condition
 # after some time (DEF_TIME_OUT).
-def restore_update_kernel_neighbors(intf_neigh_map, timeout=DEF_TIME_OUT):
-    # create object for netlink calls to kernel
-    ipclass = IPRoute()
+# With netlink_batch, the neighbors of an interface and family are installed in netlink
+# batches before the arp/nd packets are sent.
+# With raw_probes, the arp/nd packets are sent from ArpNsTemplate over a raw socket.
+# The up interfaces are restored concurrently by workers threads (IntfRestorePool), their
+# arp/nd packets share a token bucket of probe_rate packets per second and probe_burst packets,
+# which are the CoPP arp/nd meter if not given. The unreachable neighbors are probed again up to
+# probe_retries times, probe_retry_delay ms after their last probe. The probes and retries stop at
+# the timeout.
+# With stats, the counters and timings of the restore are added to the RestoreStats.
+def restore_update_kernel_neighbors(intf_neigh_map, timeout=DEF_TIME_OUT, netlink_batch=True, raw_probes=True,
+                                    event_driven=False, workers=DEF_WORKERS, probe_rate=None, probe_burst=None,
+                                    probe_retries=DEF_PROBE_RETRIES, probe_retry_delay=DEF_PROBE_RETRY_DELAY,
+                                    stats=None):
+    deadline = time.time() + timeout
+    pacer = probe_token_bucket(probe_rate, probe_burst)
+    check_probe_time(sum(len(neigh_list) for family_neigh_map in intf_neigh_map.values()
+                         for neigh_list in family_neigh_map.values()),
+                     pacer, timeout, probe_retries, probe_retry_delay)
+    restore_pool = IntfRestorePool(intf_neigh_map, workers, pacer, netlink_batch, raw_probes,
+                                   probe_retries, probe_retry_delay, stats, deadline)
     mtime = monotonic.time.time
     start_time = mtime()
     is_intf_up.counter = 0
     db = swsssdk.SonicV2Connector(host='127.0.0.1')
     db.connect(db.STATE_DB, False)
-    while (mtime() - start_time) < timeout:
-        for intf, family_neigh_map in intf_neigh_map.items():
-            # only try to restore to kernel when link is up
-            if is_intf_up(intf, db):
-                src_mac = get_if_hwaddr(intf)
-                intf_idx = ipclass.link_lookup(ifname=intf)[0]
-                # create socket per intf to send packets
-                s = conf.L2socket(iface=intf)
-
-                # Only two families: 'IPv4' and 'IPv6'
-                for family in ip_family.keys():
-                    # if ip address assigned and if we have neighs in this family, restore them
-                    src_ip = first_ip_on_intf(intf, family)
-                    if src_ip and (family in family_neigh_map):
-                        neigh_list = family_neigh_map[family]
-                        for dst_ip, dmac in neigh_list:
-                            # use netlink to set neighbor entries
-                            set_neigh_in_kernel(ipclass, family, intf_idx, dst_ip, dmac)
-
-                            log_info('Sending Neigh with family: {}, intf_idx: {}, ip: {}, mac: {}'.format(
-                            family, intf_idx, dst_ip, dmac))
-                            # sending arp/ns packet to update kernel neigh info
-                            s.send(build_arp_ns_pkt(family, src_mac, src_ip, dst_ip))
-                        # delete this family on the intf
-                        del intf_neigh_map[intf][family]
-                # close the pkt socket
-                s.close()
-
-                # if all families are deleted, remove the key
-                if len(intf_neigh_map[intf]) == 0:
-                    del intf_neigh_map[intf]
-        # map is empty, all neigh entries are restored
-        if not intf_neigh_map:
-            break
-        time.sleep(CHECK_INTERVAL)
+
+    if event_driven:
+        restore_kernel_neighbors_on_events(intf_neigh_map, timeout, db, restore_pool.submit)
+    else:
+        while (mtime() - start_time) < timeout:
+            for intf in intf_neigh_map.keys():
+                # only try to restore to kernel when link is up
+                if is_intf_up(intf, db):
+                    restore_pool.submit(intf)
+            # map is empty, all neigh entries are restored
+            if not intf_neigh_map:
+                break
+            restore_pool.wait(CHECK_INTERVAL)
     db.close(db.STATE_DB)
+    restore_pool.close()
+
+    # the restore is still signaled done on timeout, report the neighbors left behind
+    unrestored = 0
+    for intf, family_neigh_map in intf_neigh_map.items():
+        for family, neigh_list in family_neigh_map.items():
+            log_warning('{} {} neighbors are not restored on {}'.format(len(neigh_list), family, intf))
+            unrestored += len(neigh_list)
+    if stats:
+        stats.set(unrestored=unrestored)
+        stats.record('restore_elapsed')
+
+# return {(intf_idx, dst) -> state} of all the neighbors in kernel, from one RTM_GETNEIGH dump,
+# dst is the packed address
+def dump_neigh_states(ipclass):
+    states = {}
+    for neigh in ipclass.get_neighbours():
+        dst = neigh.get_attr('NDA_DST')
+        if dst and neigh['family'] in (AF_INET, AF_INET6):
+            states[(neigh['ifindex'], inet_pton(neigh['family'], dst))] = neigh['state']
+    return states
+
+# Verify the restored neighbors, restored_map in the same format as intf_neigh_map, against one
+# kernel neighbor dump, retry_delay ms after the restore. The neighbors still stale or incomplete
+# are probed again, budget probes at most, then a second dump retry_delay ms later gives the
+# reachable ratio. Returns (reachable, verified) neighbors.
+def verify_restored_neighbors(restored_map, budget=DEF_VERIFY_BUDGET, retry_delay=DEF_PROBE_RETRY_DELAY,
+                              raw_probes=True, pacer=None, stats=None):
+    ipclass = IPRoute()
+    intf_idxs = {}
+    for intf in restored_map.keys():
+        links = ipclass.link_lookup(ifname=intf)
+        if links:
+            intf_idxs[intf] = links[0]
+
+    time.sleep(retry_delay / 1000.0)
+    states = dump_neigh_states(ipclass)
+    # intf -> [(family, src_ip, neigh_list)] of the neighbors to probe again
+    reprobe = {}
+    remaining = budget
+    for intf, intf_idx in intf_idxs.items():
+        for family, neigh_list in restored_map[intf].items():
+            src_ip = first_ip_on_intf(intf, family)
+            if not src_ip:
+                continue
+            pending = NeighList(family)
+            for dst, mac in neigh_list:
+                if remaining <= 0:
+                    break
+                if states.get((intf_idx, dst), 0) & (NUD_STALE | NUD_INCOMPLETE):
+                    pending.append_packed(dst, mac)
+                    remaining -= 1
+            if len(pending):
+                reprobe.setdefault(intf, []).append((family, src_ip, pending))
+
+    probes = 0
+    for intf, families in reprobe.items():
+        sender = ProbeSender(intf, raw_probes, pacer)
+        for family, src_ip, pending in families:
+            for dst, mac in pending:
+                sender.send(family, src_ip, dst)
+        sender.close()
+        probes += sender.sent
+    if probes:
+        time.sleep(retry_delay / 1000.0)
+        states = dump_neigh_states(ipclass)
+    ipclass.close()
+
+    verified = reachable = 0
+    for intf, intf_idx in intf_idxs.items():
+        for neigh_list in restored_map[intf].values():
+            for dst, mac in neigh_list:
+                verified += 1
+                if states.get((intf_idx, dst), 0) & NUD_REACHABLE:
+                    reachable += 1
+    log_info('Verified {} restored neighbors, {} reachable, {} probed again'.format(verified, reachable, probes))
+    if stats:
+        stats.add(verify_probes=probes)
+        stats.set(verified=verified, reachable=reachable,
+                  reachable_ratio='{:.3f}'.format(float(reachable) / verified if verified else 1.0))
+        stats.record('verify_elapsed')
+    return reachable, verified
 
 
 def main():
 
+    parser = argparse.ArgumentParser(description='Restore neighbor table into kernel during system warm reboot')
+    parser.add_argument('--lua-dump', action='store_true', default=False,
+                        help='read the neighbor table with one server side lua script instead of SCAN and pipelines')
+    parser.add_argument('--no-netlink-batch', action='store_true', default=False,
+                        help='install neighbors with one netlink request per entry instead of batches')
+    parser.add_argument('--scapy-probes', action='store_true', default=False,
+                        help='build and send arp/ns packets with scapy instead of templates over a raw socket')
+    parser.add_argument('--event-driven', action='store_true', default=False,
+                        help='restore the neighbors of an interface on its netlink and stateDB events instead of polling')
+    parser.add_argument('--workers', type=int, default=DEF_WORKERS,
+                        help='number of interfaces restored concurrently')
+    parser.add_argument('--probe-rate', type=int, default=None,
+                        help='arp/ns packets sent per second by all the workers, 0 for no limit, '
+                             'the cir of the CoPP arp/nd meter by default. The neighbors are probed within '
+                             'the restore timeout ({}s) only if their number / probe rate, plus the retry '
+                             'delays, is below it, a warning is logged otherwise and the neighbors left at the '
+                             'timeout are set in kernel without probes'.format(DEF_TIME_OUT))
+    parser.add_argument('--probe-burst', type=int, default=None,
+                        help='arp/ns packets sent in a burst, the cbs of the CoPP arp/nd meter by default')
+    parser.add_argument('--probe-retries', type=int, default=DEF_PROBE_RETRIES,
+                        help='times the unreachable neighbors are probed again')
+    parser.add_argument('--probe-retry-delay', type=int, default=DEF_PROBE_RETRY_DELAY,
+                        help='ms after the last probe before the unreachable neighbors are probed again')
+    parser.add_argument('--no-entry-log', action='store_true', default=False,
+                        help='do not log every neighbor entry installed and probed')
+    parser.add_argument('--verify', action='store_true', default=False,
+                        help='verify the restored neighbors with a kernel neighbor dump and probe the stale ones again')
+    parser.add_argument('--verify-budget', type=int, default=DEF_VERIFY_BUDGET,
+                        help='stale or incomplete neighbors probed again by the verification, at most')
+    args = parser.parse_args()
+
+    global log_entries
+    log_entries = not args.no_entry_log
+    stats = RestoreStats()
+
     log_info ("restore_neighbors service is started")
     # Use warmstart python binding to check warmstart information
     warmstart = swsscommon.WarmStart()
@@ -290,17 +1173,46 @@ def main():
         return
     # read the neigh table from appDB to internal map
     try:
-        intf_neigh_map = read_neigh_table_to_maps()
+        intf_neigh_map = read_neigh_table_to_maps(args.lua_dump)
     except RuntimeError as e:
         logger.exception(str(e))
         sys.exit(1)
+    stats.add(entries_read=sum(len(neigh_list) for family_neigh_map in intf_neigh_map.values()
+                               for neigh_list in family_neigh_map.values()))
+    stats.record('read_elapsed')
+    # the restored families are deleted from intf_neigh_map, keep the neighbor lists to verify them
+    restored_map = dict((intf, dict(family_neigh_map)) for intf, family_neigh_map in intf_neigh_map.items())
 
     try:
-        restore_update_kernel_neighbors(intf_neigh_map)
+        restore_update_kernel_neighbors(intf_neigh_map, netlink_batch=not args.no_netlink_batch,
+                                        raw_probes=not args.scapy_probes,
+                                        event_driven=args.event_driven,
+                                        workers=args.workers,
+                                        probe_rate=args.probe_rate,
+                                        probe_burst=args.probe_burst,
+                                        probe_retries=args.probe_retries,
+                                        probe_retry_delay=args.probe_retry_delay,
+                                        stats=stats)
     except Exception as e:
         logger.exception(str(e))
+        stats.save()
         sys.exit(1)
 
+    if args.verify:
+        # the neighbors which are not restored are not verified
+        for intf, family_neigh_map in intf_neigh_map.items():
+            for family in family_neigh_map.keys():
+                del restored_map[intf][family]
+        try:
+            verify_restored_neighbors(restored_map, args.verify_budget, args.probe_retry_delay,
+                                      not args.scapy_probes, probe_token_bucket(args.probe_rate, args.probe_burst),
+                                      stats)
+        except Exception as e:
+            # the verification is best effort, do not hold the restore for it
+            logger.exception(str(e))
+            log_error('Failed to verify the restored neighbors: {}'.format(e))
+    stats.save()
+
     # set statedb to signal other processes like neighsyncd
     set_statedb_neigh_restore_done()
     log_info ("restore_neighbor service is done for system warmreboot")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+""""
+Description: restore_neighbors_benchmark.py -- benchmarking neighbor table restore of restore_neighbors.py.
+    The script loads synthetic NEIGH_TABLE entries into a local redis and times reading them back into
+    the restore maps with:
+        keys:  KEYS NEIGH_TABLE:* and one HGETALL round trip per entry, as restore_neighbors.py used to
+        scan:  SCAN and pipelined HGETALL in batches
+        lua:   one server side lua dump
+    The entries are spread over --intfs interfaces, half IPv4 and half IPv6.
+
+    Use a scratch redis database (--db), the NEIGH_TABLE entries of that database are flushed.
+"""
+
+import time
+import json
+import redis
+import argparse
+import restore_neighbors
+
+def gen_neigh_table(client, num_entries, num_intfs):
+    pipe = client.pipeline(transaction=False)
+    for i in range(num_entries):
+        intf = "Vlan%d" % (1000 + i % num_intfs)
+        mac = "00:11:%02x:%02x:%02x:%02x" % (i >> 24 & 0xff, i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+        if i % 2 == 0:
+            key = "NEIGH_TABLE:%s:10.%d.%d.%d" % (intf, i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+            pipe.hmset(key, {'neigh': mac, 'family': 'IPv4'})
+        else:
+            key = "NEIGH_TABLE:%s:fc00::%x:%x" % (intf, i >> 16, i & 0xffff)
+            pipe.hmset(key, {'neigh': mac, 'family': 'IPv6'})
+        if i % restore_neighbors.READ_BATCH_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+
+def clean_neigh_table(client):
+    keys = [key for key in client.scan_iter(match='NEIGH_TABLE:*', count=restore_neighbors.READ_BATCH_SIZE)]
+    for i in range(0, len(keys), restore_neighbors.READ_BATCH_SIZE):
+        client.delete(*keys[i:i + restore_neighbors.READ_BATCH_SIZE])
+
+def keys_neigh_table(client):
+    for key in client.keys('NEIGH_TABLE:*'):
+        yield key, client.hgetall(key)
+
+def count_entries(intf_neigh_map):
+    return sum(len(neighs) for family_neigh_map in intf_neigh_map.values() for neighs in family_neigh_map.values())
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark neighbor table read of restore_neighbors.py')
+    parser.add_argument('--entries', type=int, nargs='+', default=[1000, 10000, 50000, 100000],
+                        help='numbers of generated neighbor entries')
+    parser.add_argument('--intfs', type=int, default=16,
+                        help='number of interfaces the entries are spread over')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[restore_neighbors.READ_BATCH_SIZE],
+                        help='SCAN and pipeline batch sizes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--db', type=int, default=15,
+                        help='scratch redis database used for the benchmark')
+    parser.add_argument('--output', default=None,
+                        help='save the results to this json file')
+    args = parser.parse_args()
+
+    client = redis.Redis(host=args.host, port=args.port, db=args.db)
+
+    methods = [('keys', keys_neigh_table)]
+    for batch_size in args.batch_size:
+        methods.append(('scan/%d' % batch_size, lambda c, b=batch_size: restore_neighbors.scan_neigh_table(c, b)))
+    methods.append(('lua', restore_neighbors.dump_neigh_table))
+
+    results = []
+    print "%-10s %-12s %-10s %-10s" % ('entries', 'method', 'total_ms', 'us/entry')
+    for num_entries in args.entries:
+        clean_neigh_table(client)
+        gen_neigh_table(client, num_entries, args.intfs)
+        for name, method in methods:
+            start = time.time()
+            intf_neigh_map = restore_neighbors.neigh_entries_to_maps(method(client))
+            elapsed = time.time() - start
+            assert count_entries(intf_neigh_map) == num_entries
+            print "%-10d %-12s %-10d %-10.2f" % (num_entries, name, elapsed * 1000, elapsed * 1e6 / num_entries)
+            results.append({'entries': num_entries, 'method': name, 'elapsed': elapsed})
+    clean_neigh_table(client)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    return
+
+if __name__ == '__main__':
+    main()
@@ -42,7 +42,8 @@ bool gIsNatSupported = false;
 OrchDaemon::OrchDaemon(DBConnector *applDb, DBConnector *configDb, DBConnector *stateDb) :
         m_applDb(applDb),
         m_configDb(configDb),
-        m_stateDb(stateDb)
+        m_stateDb(stateDb),
+        m_initDone(false)
 {
     SWSS_LOG_ENTER();
 }
@@ -432,6 +433,23 @@ void OrchDaemon::flush()
     }
 }
 
+/* Publish the init state of orchagent, for the processes and tests waiting for it */
+void OrchDaemon::setInitDone(bool done)
+{
+    SWSS_LOG_ENTER();
+
+    Table stateTable(m_stateDb, STATE_ORCHAGENT_TABLE_NAME);
+    vector<FieldValueTuple> fvs;
+    fvs.emplace_back("init_done", done ? "true" : "false");
+    stateTable.set(STATE_ORCHAGENT_KEY, fvs);
+
+    m_initDone = done;
+    if (done)
+    {
+        SWSS_LOG_NOTICE("Orchagent initialization is done");
+    }
+}
+
 void OrchDaemon::start()
 {
     SWSS_LOG_ENTER();
@@ -441,6 +459,8 @@ void OrchDaemon::start()
         m_select->addSelectables(o->getSelectables());
     }
 
+    setInitDone(false);
+
     while (true)
     {
         Selectable *s;
@@ -477,6 +497,12 @@ void OrchDaemon::start()
          */
         flush();
 
+        /* All the ports are created in hardware and kernel, and ready */
+        if (!m_initDone && gPortsOrch->allPortsReady())
+        {
+            setInitDone(true);
+        }
+
         /*
          * Asked to check warm restart readiness.
          * Not doing this under Select::TIMEOUT condition because of
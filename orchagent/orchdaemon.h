@@ -34,6 +34,10 @@
 
 using namespace swss;
 
+/* State of orchagent in STATE_DB, init_done is set once all the ports are ready */
+#define STATE_ORCHAGENT_TABLE_NAME "ORCHAGENT_STATE_TABLE"
+#define STATE_ORCHAGENT_KEY "state"
+
 class OrchDaemon
 {
 public:
@@ -54,8 +58,10 @@ private:
 
     std::vector<Orch *> m_orchList;
     Select *m_select;
+    bool m_initDone;
 
     void flush();
+    void setInitDone(bool done);
 };
 
 #endif /* SWSS_ORCHDAEMON_H */
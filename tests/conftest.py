@@ -11,13 +11,104 @@ import tarfile
 import StringIO
 import subprocess
 from datetime import datetime
+from collections import OrderedDict
 from swsscommon import swsscommon
 
+try:
+    from xdist.scheduler import LoadScopeScheduling
+except ImportError:
+    LoadScopeScheduling = None
+
+# durations of the test modules of the last runs, to schedule the longest modules first
+DEF_DURATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".test_durations.json")
+
+# test module -> duration of this run
+module_durations = {}
+
+# wait primitives of DockerVirtualSwitch: default timeout, and interval the condition is checked
+# again when no keyspace notification is received
+DEF_WAIT_TIMEOUT = 10
+WAIT_RECHECK_INTERVAL = 1
+
+# timeout of the config helpers of DockerVirtualSwitch to wait for their changes to be applied,
+# the helpers do not fail on timeout as some tests expect the changes to be rejected
+HELPER_WAIT_TIMEOUT = 3
+# ASIC_DB quiet time after which a change without a known result is considered applied
+ASIC_IDLE_TIME = 0.5
+# the pubsub collectors of DockerVirtualSwitch stop once no keyspace notification is received for
+# this many milliseconds after the last one
+SUBSCRIBE_IDLE_MS = 500
+
+# redis DBs of the dvs, APPL_DB to STATE_DB
+DVS_DBS = range(8)
+# DBs rebuilt by syncd and orchagent on their cold start, flushed instead of restored from the
+# baseline of a reused dvs: ASIC_DB, COUNTERS_DB and FLEX_COUNTER_DB
+DVS_REBUILT_DBS = [swsscommon.ASIC_DB, swsscommon.COUNTERS_DB, swsscommon.FLEX_COUNTER_DB]
+
+# programs left running by restore_baseline(), start.sh starts all the others again
+DVS_BASE_PROGRAMS = ["redis-server", "rsyslogd", "start.sh"]
+
+# set by orchagent in STATE_DB once all the ports are ready
+ORCHAGENT_STATE_KEY = "ORCHAGENT_STATE_TABLE|state"
+# seconds orchagent has to create its state key once running, the images which do not create it
+# are considered ready once their processes are running
+ORCHAGENT_STATE_WAIT = 10
+
+# run in the dvs by check_ready(), waits until the given processes are RUNNING and start.sh
+# EXITED, checked every 100ms through the supervisord XML-RPC interface
+SUPERVISOR_READY_SCRIPT = """
+import sys
+import time
+import socket
+try:
+    import xmlrpclib
+    from supervisor.xmlrpc import SupervisorTransport
+except ImportError:
+    print "NO_XMLRPC"
+    sys.exit(2)
+
+deadline = time.time() + float(sys.argv[1])
+names = sys.argv[2:]
+server = xmlrpclib.ServerProxy("http://localhost",
+        transport=SupervisorTransport(None, None, "unix:///var/run/supervisor.sock"))
+status = {}
+while time.time() < deadline:
+    try:
+        status = dict((p["name"], p["statename"]) for p in server.supervisor.getAllProcessInfo())
+    except (socket.error, xmlrpclib.Fault):
+        pass
+    if all(status.get(n) == "RUNNING" for n in names) and status.get("start.sh") == "EXITED":
+        print "READY"
+        sys.exit(0)
+    time.sleep(0.1)
+for name, state in sorted(status.items()):
+    print name, state
+sys.exit(1)
+"""
+
 def ensure_system(cmd):
     rc = os.WEXITSTATUS(os.system(cmd))
     if rc:
         raise RuntimeError('Failed to run command: %s' % cmd)
 
+def ensure_ip_batch(cmds, pid=None, force=False):
+    """run the ip commands with one ip -batch, in the netns of pid if given, returns the output"""
+    args = ["ip", "-force", "-batch", "-"] if force else ["ip", "-batch", "-"]
+    if pid:
+        args = ["nsenter", "-t", str(pid), "-n"] + args
+    p = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate("\n".join(cmds) + "\n")
+    if p.returncode:
+        raise RuntimeError('Failed to run ip batch: %s' % err)
+    return out
+
+def ensure_parallel(cmds):
+    """run the commands concurrently, raises if any of them failed"""
+    procs = [subprocess.Popen(cmd, shell=True) for cmd in cmds]
+    failed = [cmd for cmd, p in zip(cmds, procs) if p.wait()]
+    if failed:
+        raise RuntimeError('Failed to run command: %s' % failed[0])
+
 def pytest_addoption(parser):
     parser.addoption("--dvsname", action="store", default=None,
                       help="dvs name")
@@ -25,15 +116,226 @@ def pytest_addoption(parser):
                       help="keep testbed after test")
     parser.addoption("--imgname", action="store", default="docker-sonic-vs",
                       help="image name")
+    parser.addoption("--reuse-dvs", action="store_true", default=False,
+                      help="keep the dvs between test modules, restored to its state after the first bring-up")
+    parser.addoption("--scale-entries", action="store", default="1000",
+                      help="comma separated numbers of entries pushed by test_scale.py, e.g. 1000,10000,100000")
+    parser.addoption("--scale-results", action="store", default=None,
+                      help="json file test_scale.py saves its results to, they are only printed by default")
+    parser.addoption("--durations-file", action="store", default=DEF_DURATIONS_FILE,
+                      help="file of the test module durations, used to schedule the longest modules first with -n")
+
+def is_xdist_worker(config):
+    return hasattr(config, "slaveinput") or hasattr(config, "workerinput")
+
+def load_durations(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def pytest_configure(config):
+    numprocesses = config.getoption("numprocesses", default=None)
+    if config.getoption("--dvsname") and numprocesses and numprocesses > 1:
+        raise pytest.UsageError("--dvsname can not be shared by parallel workers, run with -n 1 or without --dvsname")
+
+# sum the durations of setup, call and teardown per test module, the dvs creation is in the
+# setup of the first test of the module. With xdist, the reports of the workers are collected
+# by the master which saves the durations.
+def pytest_runtest_logreport(report):
+    module = report.nodeid.split("::", 1)[0]
+    module_durations[module] = module_durations.get(module, 0) + report.duration
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if is_xdist_worker(config) or not module_durations:
+        return
+    path = config.getoption("--durations-file")
+    durations = load_durations(path)
+    durations.update(module_durations)
+    try:
+        with open(path, "w") as f:
+            json.dump(durations, f, indent=4, sort_keys=True)
+    except IOError:
+        pass
+
+if LoadScopeScheduling:
+    class ModuleDurationScheduling(LoadScopeScheduling):
+        """Schedule whole test modules on the xdist workers, each worker owns its dvs, the
+        modules without a recorded duration first, then the longest modules first"""
+
+        def __init__(self, config, log=None):
+            LoadScopeScheduling.__init__(self, config, log)
+            self.durations = load_durations(config.getoption("--durations-file"))
+            self.sorted = False
+
+        def _split_scope(self, nodeid):
+            return nodeid.split("::", 1)[0]
+
+        def _assign_work_unit(self, node):
+            if not self.sorted:
+                self.workqueue = OrderedDict(sorted(self.workqueue.items(),
+                        key=lambda item: self.durations.get(item[0], float("inf")), reverse=True))
+                self.sorted = True
+            LoadScopeScheduling._assign_work_unit(self, node)
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    if LoadScopeScheduling and config.getoption("dist") in ("load", "loadscope"):
+        return ModuleDurationScheduling(config, log)
+
+class AsicDbIndex(object):
+    """Cache of the ASIC_DB objects, {object type: {oid or key: {attribute: value}}}, loaded
+    with SCAN and pipelined HGETALL, then kept up to date from the keyspace notifications which
+    are applied by sync() before every lookup. find() looks up the objects by an attribute value
+    with an index built on its first use. The cache is loaded again if the redis connection is
+    lost, e.g. after the dvs restarts."""
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, redis_sock):
+        self.redis_sock = redis_sock
+        self.pubsub = None
+        self.load()
+
+    def load(self):
+        if self.pubsub:
+            self.close()
+        self.r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.ASIC_DB)
+        # subscribe before loading, so that no change is missed
+        self.pubsub = self.r.pubsub()
+        self.pubsub.psubscribe("__keyspace@{}__:ASIC_STATE:*".format(swsscommon.ASIC_DB))
+        self.objects = {}
+        # (object type, attribute) -> {value: set of oids}
+        self.attr_index = {}
+        keys = list(self.r.scan_iter(match="ASIC_STATE:*", count=self.BATCH_SIZE))
+        self.reload_keys(keys)
+
+    def reload_keys(self, keys):
+        for i in range(0, len(keys), self.BATCH_SIZE):
+            batch = keys[i:i + self.BATCH_SIZE]
+            pipe = self.r.pipeline(transaction=False)
+            for key in batch:
+                pipe.hgetall(key)
+            for key, values in zip(batch, pipe.execute()):
+                self.update(key, values)
+
+    def update(self, key, values):
+        (_, objtype, oid) = key.split(":", 2)
+        objs = self.objects.setdefault(objtype, {})
+        old = objs.pop(oid, None)
+        if old:
+            for (t, attr), index in self.attr_index.items():
+                if t == objtype and attr in old:
+                    index.get(old[attr], set()).discard(oid)
+        if not values:
+            return
+        objs[oid] = values
+        for (t, attr), index in self.attr_index.items():
+            if t == objtype and attr in values:
+                index.setdefault(values[attr], set()).add(oid)
+
+    def sync(self):
+        """apply the changes notified since the last sync"""
+        try:
+            keys = set()
+            message = self.pubsub.get_message()
+            while message:
+                if message["type"] == "pmessage":
+                    keys.add(message["channel"].split(":", 1)[1])
+                message = self.pubsub.get_message()
+            self.reload_keys(list(keys))
+        except redis.ConnectionError:
+            self.load()
+
+    def get_objects(self, objtype):
+        self.sync()
+        return self.objects.get(objtype, {})
+
+    def get(self, objtype, oid):
+        self.sync()
+        return self.objects.get(objtype, {}).get(oid)
+
+    def find(self, objtype, attr, value):
+        """return the oids of the objtype objects with attr set to value"""
+        self.sync()
+        index = self.attr_index.get((objtype, attr))
+        if index is None:
+            index = self.attr_index[(objtype, attr)] = {}
+            for oid, values in self.objects.get(objtype, {}).items():
+                if attr in values:
+                    index.setdefault(values[attr], set()).add(oid)
+        return list(index.get(value, ()))
+
+    def close(self):
+        try:
+            self.pubsub.close()
+        except redis.ConnectionError:
+            pass
+
+class TableSnapshot(object):
+    """Snapshot of a table, {key: {field: value}}. read() reads a table of a DB other than
+    ASIC_DB with one lua script returning all the entries in a single round trip, the ASIC_STATE
+    tables are taken from the AsicDbIndex. find() looks up the keys by a field value with an
+    index built on its first use, so that many lookups on large tables are done in memory."""
+
+    DUMP_LUA = """
+local entries = {}
+for _, key in ipairs(redis.call('KEYS', ARGV[1])) do
+    table.insert(entries, {key, redis.call('HGETALL', key)})
+end
+return entries
+"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        # field -> {value: [keys]}
+        self.index = {}
+
+    @classmethod
+    def read(cls, redis_sock, db_id, table):
+        r = redis.Redis(unix_socket_path=redis_sock, db=db_id)
+        separator = "|" if db_id in (swsscommon.CONFIG_DB, swsscommon.STATE_DB) else ":"
+        prefix = table + separator
+        entries = {}
+        for key, fvs in r.eval(cls.DUMP_LUA, 0, prefix + "*"):
+            entries[key[len(prefix):]] = dict(zip(fvs[0::2], fvs[1::2]))
+        return cls(entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def find(self, field, value):
+        """return the keys of the entries with field set to value"""
+        index = self.index.get(field)
+        if index is None:
+            index = self.index[field] = {}
+            for key, fvs in self.entries.items():
+                if field in fvs:
+                    index.setdefault(fvs[field], []).append(key)
+        return index.get(value, [])
+
+    def find_all(self, attributes):
+        """return the keys of the entries with all the attributes, a list of (field, value)"""
+        keys = None
+        for field, value in attributes:
+            found = set(self.find(field, value))
+            keys = found if keys is None else keys & found
+            if not keys:
+                return []
+        return self.keys() if keys is None else list(keys)
 
 class AsicDbValidator(object):
     def __init__(self, dvs):
         self.adb = swsscommon.DBConnector(1, dvs.redis_sock, 0)
+        self.index = AsicDbIndex(dvs.redis_sock)
 
         # get default dot1q vlan id
-        atbl = swsscommon.Table(self.adb, "ASIC_STATE:SAI_OBJECT_TYPE_VLAN")
-
-        keys = atbl.getKeys()
+        keys = self.index.get_objects("SAI_OBJECT_TYPE_VLAN").keys()
         assert len(keys) == 1
         self.default_vlan_id = keys[0]
 
@@ -42,20 +344,12 @@ class AsicDbValidator(object):
         self.portnamemap = {}
         self.hostifoidmap = {}
         self.hostifnamemap = {}
-        atbl = swsscommon.Table(self.adb, "ASIC_STATE:SAI_OBJECT_TYPE_HOSTIF")
-        keys = atbl.getKeys()
-
-        assert len(keys) == 32
-        for k in keys:
-            (status, fvs) = atbl.get(k)
-
-            assert status == True
+        hostifs = self.index.get_objects("SAI_OBJECT_TYPE_HOSTIF")
 
-            for fv in fvs:
-                if fv[0] == "SAI_HOSTIF_ATTR_OBJ_ID":
-                    port_oid = fv[1]
-                elif fv[0] == "SAI_HOSTIF_ATTR_NAME":
-                    port_name = fv[1]
+        assert len(hostifs) == 32
+        for k, fvs in hostifs.items():
+            port_oid = fvs["SAI_HOSTIF_ATTR_OBJ_ID"]
+            port_name = fvs["SAI_HOSTIF_ATTR_NAME"]
 
             self.portoidmap[port_oid] = port_name
             self.portnamemap[port_name] = port_oid
@@ -63,14 +357,12 @@ class AsicDbValidator(object):
             self.hostifnamemap[port_name] = k
 
         # get default acl table and acl rules
-        atbl = swsscommon.Table(self.adb, "ASIC_STATE:SAI_OBJECT_TYPE_ACL_TABLE")
-        keys = atbl.getKeys()
+        keys = self.index.get_objects("SAI_OBJECT_TYPE_ACL_TABLE").keys()
 
         assert len(keys) >= 1
         self.default_acl_tables = keys
 
-        atbl = swsscommon.Table(self.adb, "ASIC_STATE:SAI_OBJECT_TYPE_ACL_ENTRY")
-        keys = atbl.getKeys()
+        keys = self.index.get_objects("SAI_OBJECT_TYPE_ACL_ENTRY").keys()
 
         assert len(keys) == 2
         self.default_acl_entries = keys
@@ -89,43 +381,101 @@ class ApplDbValidator(object):
                 continue
             assert int(m.group(1)) > 0
 
+def setup_virtual_servers(pid, servers):
+    """create the netns and links of the servers for the switch in the netns of pid: the netns and
+    veth pairs of all the servers with one ip -batch, their links in the switch set up with another
+    one, then the settings in each server in parallel"""
+    if not servers:
+        return
+
+    # the veth pairs are created directly in the server and switch netns with their final names,
+    # so that switches can be created in parallel
+    cmds = []
+    for s in servers:
+        cmds.append("netns add %s" % s.nsname)
+        cmds.append("link add eth0 netns %s type veth peer name %s netns %d" % (s.nsname, s.pifname, pid))
+    ensure_ip_batch(cmds)
+
+    # bring up link in the virtual switch, disable arp, so no neigh on physical interfaces
+    cmds = []
+    for s in servers:
+        cmds.append("link set dev %s arp off" % s.pifname)
+        cmds.append("link set dev %s up" % s.pifname)
+    ensure_ip_batch(cmds, pid)
+
+    # bring up link in the virtual servers
+    cmds = ["nsenter -t %d -n sysctl -q -w %s" % (pid, " ".join("net.ipv6.conf.%s.disable_ipv6=1" % s.pifname for s in servers))]
+    for s in servers:
+        cmds.append("ip -n %s link set dev eth0 up" % s.nsname)
+        cmds.append("nsenter --net=/var/run/netns/%s ethtool -K eth0 tx off" % s.nsname)
+    ensure_parallel(cmds)
+
+def create_virtual_servers(ctn_name, pid, count):
+    """create the count virtual servers of a switch, the existing ones are reused"""
+    servers = [VirtualServer(ctn_name, pid, i, create=False) for i in range(count)]
+    setup_virtual_servers(pid, [s for s in servers if s.cleanup])
+    return servers
+
+def destroy_virtual_servers(servers):
+    """kill the processes left in the netns of the servers and delete them, with one ip -batch each"""
+    nsnames = [s.nsname for s in servers if s.cleanup]
+    if not nsnames:
+        return
+    pids = ensure_ip_batch(["netns pids %s" % nsname for nsname in nsnames], force=True).split()
+    if pids:
+        os.system("kill %s" % " ".join(str(int(pid)) for pid in pids))
+    ensure_ip_batch(["netns delete %s" % nsname for nsname in nsnames], force=True)
+
+def get_virtual_servers_state(servers):
+    """{netns: (mac, mtu)} of eth0 of the servers, for reset_virtual_servers()"""
+    state = {}
+    for s in servers:
+        out = subprocess.check_output(["ip", "-n", s.nsname, "-o", "link", "show", "dev", "eth0"])
+        m = re.search(r' mtu (\d+) .* link/ether (\S+)', out)
+        state[s.nsname] = (m.group(2), m.group(1))
+    return state
+
+def reset_virtual_servers(servers, state):
+    """bring the servers back to state, from get_virtual_servers_state(): the processes left in
+    their netns are killed, the links but lo and eth0 deleted, and eth0 set up again with its mac
+    and mtu, without the addresses, routes and neighbors configured since, in parallel"""
+    if not servers:
+        return
+    pids = ensure_ip_batch(["netns pids %s" % s.nsname for s in servers], force=True).split()
+    if pids:
+        os.system("kill %s" % " ".join(str(int(pid)) for pid in pids))
+    cmds = []
+    for s in servers:
+        (mac, mtu) = state[s.nsname]
+        ip = "ip -n %s " % s.nsname
+        out = subprocess.check_output(["ip", "-n", s.nsname, "-o", "link", "show"])
+        # a link may already be deleted with its veth peer
+        dels = [ip + "link del %s 2>/dev/null" % link for link in re.findall(r'^\d+: ([^:@]+)', out, re.M)
+                if link not in ("lo", "eth0")]
+        # the ipv4 routes are removed by the kernel with the addresses and the link down, the ipv6
+        # ones are kept
+        steps = [ip + "link set dev eth0 down",
+                  ip + "addr flush dev eth0",
+                  ip + "-6 route flush dev eth0",
+                  ip + "neigh flush dev eth0",
+                  ip + "link set dev eth0 address %s mtu %s arp on up" % (mac, mtu)]
+        cmds.append("; ".join(dels + [" && ".join(steps)]))
+    ensure_parallel(cmds)
+
 class VirtualServer(object):
-    def __init__(self, ctn_name, pid, i):
+    def __init__(self, ctn_name, pid, i, create=True):
         self.nsname = "%s-srv%d" % (ctn_name, i)
         self.pifname = "eth%d" % (i + 1)
         self.cleanup = True
 
-        # create netns
+        # create netns, unless it is created with the other servers by create_virtual_servers()
         if os.path.exists("/var/run/netns/%s" % self.nsname):
             self.cleanup = False
-        else:
-            ensure_system("ip netns add %s" % self.nsname)
-
-            # create vpeer link
-            ensure_system("ip link add %s type veth peer name %s" % (self.nsname[0:12], self.pifname))
-            ensure_system("ip link set %s netns %s" % (self.nsname[0:12], self.nsname))
-            ensure_system("ip link set %s netns %d" % (self.pifname, pid))
-
-            # bring up link in the virtual server
-            ensure_system("ip netns exec %s ip link set dev %s name eth0" % (self.nsname, self.nsname[0:12]))
-            ensure_system("ip netns exec %s ip link set dev eth0 up" % (self.nsname))
-            ensure_system("ip netns exec %s ethtool -K eth0 tx off" % (self.nsname))
-
-            # bring up link in the virtual switch
-            ensure_system("nsenter -t %d -n ip link set dev %s up" % (pid, self.pifname))
-
-            # disable arp, so no neigh on physical interfaces
-            ensure_system("nsenter -t %d -n ip link set arp off dev %s" % (pid, self.pifname))
-            ensure_system("nsenter -t %d -n sysctl -w net.ipv6.conf.%s.disable_ipv6=1" % (pid, self.pifname))
+        elif create:
+            setup_virtual_servers(pid, [self])
 
     def destroy(self):
-        if self.cleanup:
-            pids = subprocess.check_output("ip netns pids %s" % (self.nsname), shell=True)
-            if pids:
-                for pid in pids.split('\n'):
-                    if len(pid) > 0:
-                        os.system("kill %s" % int(pid))
-            ensure_system("ip netns delete %s" % self.nsname)
+        destroy_virtual_servers([self])
 
     def runcmd(self, cmd):
         try:
@@ -191,10 +541,7 @@ class DockerVirtualSwitch(object):
             self.ctn_sw_pid = int(output)
 
             # create virtual servers
-            self.servers = []
-            for i in range(32):
-                server = VirtualServer(ctn_sw_name, self.ctn_sw_pid, i)
-                self.servers.append(server)
+            self.servers = create_virtual_servers(ctn_sw_name, self.ctn_sw_pid, 32)
 
             self.mount = "/var/run/redis-vs/{}".format(ctn_sw_name)
 
@@ -207,10 +554,7 @@ class DockerVirtualSwitch(object):
             self.ctn_sw_pid = int(output)
 
             # create virtual server
-            self.servers = []
-            for i in range(32):
-                server = VirtualServer(self.ctn_sw.name, self.ctn_sw_pid, i)
-                self.servers.append(server)
+            self.servers = create_virtual_servers(self.ctn_sw.name, self.ctn_sw_pid, 32)
 
             # mount redis to base to unique directory
             self.mount = "/var/run/redis-vs/{}".format(self.ctn_sw.name)
@@ -225,6 +569,8 @@ class DockerVirtualSwitch(object):
                     volumes={ self.mount: { 'bind': '/var/run/redis', 'mode': 'rw' } })
 
         self.appldb = None
+        self.asicdb = None
+        self.baseline = None
         self.redis_sock = self.mount + '/' + "redis.sock"
         try:
             # temp fix: remove them once they are moved to vs start.sh
@@ -242,32 +588,60 @@ class DockerVirtualSwitch(object):
     def destroy(self):
         if self.appldb:
             del self.appldb
+        if self.asicdb:
+            self.asicdb.index.close()
         if self.cleanup:
             self.ctn.remove(force=True)
             self.ctn_sw.remove(force=True)
             os.system("rm -rf {}".format(self.mount))
-            for s in self.servers:
-                s.destroy()
+            destroy_virtual_servers(self.servers)
 
     def check_ready(self, timeout=30):
-        '''check if all processes in the dvs is ready'''
+        '''check if all processes in the dvs is ready, and orchagent is initialized'''
 
+        deadline = time.time() + timeout
+        res = self.ctn.exec_run(["python", "-c", SUPERVISOR_READY_SCRIPT, str(timeout)] + self.alld)
+        try:
+            out = res.output
+        except AttributeError:
+            out = res
+        if "NO_XMLRPC" in out:
+            self.check_processes_ready(timeout)
+        elif "READY" not in out:
+            raise ValueError(out)
+
+        if not self.wait_for_entry(swsscommon.STATE_DB, ORCHAGENT_STATE_KEY,
+                                   timeout=min(ORCHAGENT_STATE_WAIT, max(deadline - time.time(), 0))):
+            print "orchagent does not set {}, its init state is not checked".format(ORCHAGENT_STATE_KEY)
+            return
+        if not self.wait_for_entry(swsscommon.STATE_DB, ORCHAGENT_STATE_KEY, {"init_done": "true"},
+                                   max(deadline - time.time(), 0)):
+            raise ValueError("orchagent init is not done")
+
+    def get_process_status(self):
+        """{program: state} of the supervisord programs in the dvs"""
         re_space = re.compile('\s+')
         process_status = {}
+        res = self.ctn.exec_run("supervisorctl status")
+        try:
+            out = res.output
+        except AttributeError:
+            out = res
+        for l in out.split('\n'):
+            fds = re_space.split(l)
+            if len(fds) < 2:
+                continue
+            process_status[fds[0]] = fds[1]
+        return process_status
+
+    def check_processes_ready(self, timeout=30):
+        '''check if all processes in the dvs are running with supervisorctl status'''
+
         ready = False
         started = 0
         while True:
             # get process status
-            res = self.ctn.exec_run("supervisorctl status")
-            try:
-                out = res.output
-            except AttributeError:
-                out = res
-            for l in out.split('\n'):
-                fds = re_space.split(l)
-                if len(fds) < 2:
-                    continue
-                process_status[fds[0]] = fds[1]
+            process_status = self.get_process_status()
 
             # check if all processes are running
             ready = True
@@ -287,7 +661,7 @@ class DockerVirtualSwitch(object):
 
             started += 1
             if started > timeout:
-                raise ValueError(out)
+                raise ValueError(process_status)
 
             time.sleep(1)
 
@@ -317,6 +691,78 @@ class DockerVirtualSwitch(object):
     def restart(self):
         self.ctn.restart()
 
+    def get_netdev_state(self):
+        """{link: (mtu, up, [global addresses])} of the links in the dvs"""
+        links = {}
+        (exitcode, out) = self.runcmd("ip -o link show")
+        for l in out.split('\n'):
+            m = re.match('^\d+: ([^:@]+)(@\S+)?: <([^>]*)>.* mtu (\d+)', l)
+            if m:
+                links[m.group(1)] = (m.group(4), "UP" in m.group(3).split(','), [])
+        (exitcode, out) = self.runcmd("ip -o addr show scope global")
+        for l in out.split('\n'):
+            fds = l.split()
+            if len(fds) > 3 and fds[1] in links:
+                links[fds[1]][2].append(fds[3])
+        return links
+
+    def take_baseline(self):
+        """save the redis DBs, but the ones rebuilt by the daemons, the links of the dvs and eth0 of
+        its servers, for restore_baseline()"""
+        dbs = {}
+        for db in DVS_DBS:
+            if db in DVS_REBUILT_DBS:
+                continue
+            r = redis.Redis(unix_socket_path=self.redis_sock, db=db)
+            keys = list(r.scan_iter(count=1000))
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                pipe.dump(key)
+            dbs[db] = zip(keys, pipe.execute())
+        self.baseline = (dbs, self.get_netdev_state(), get_virtual_servers_state(self.servers))
+
+    def restore_baseline(self):
+        """bring the dvs back to its baseline without restarting the container: all the programs
+        but DVS_BASE_PROGRAMS are stopped, the redis DBs, the links and the servers are restored,
+        then start.sh is run again to start the daemons and load the swssconfig files"""
+        dbs, links, servers = self.baseline
+        programs = [p for p in self.get_process_status() if p not in DVS_BASE_PROGRAMS]
+        self.runcmd(['sh', '-c', "supervisorctl stop {}".format(" ".join(programs))])
+
+        for db in DVS_DBS:
+            r = redis.Redis(unix_socket_path=self.redis_sock, db=db)
+            pipe = r.pipeline(transaction=False)
+            pipe.flushdb()
+            for key, value in dbs.get(db, []):
+                pipe.restore(key, 0, value)
+            pipe.execute()
+        # orchagent sets its init state again once it is started
+        redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.STATE_DB).delete(ORCHAGENT_STATE_KEY)
+
+        # remove the links created since the baseline, links recreated by the daemons are left
+        # for them, the others get their mtu, admin status and addresses back
+        cmds = []
+        current = self.get_netdev_state()
+        for link in current:
+            if link not in links:
+                cmds.append("ip link del {}".format(link))
+                print "remove extra link {}".format(link)
+        for link, (mtu, up, addrs) in links.items():
+            if link not in current:
+                continue
+            cmds.append("ip link set dev {} mtu {} {}".format(link, mtu, "up" if up else "down"))
+            cmds.append("ip addr flush dev {} scope global".format(link))
+            cmds.append("ip neigh flush dev {}".format(link))
+            for addr in addrs:
+                cmds.append("ip addr add {} dev {}".format(addr, link))
+        self.runcmd(['sh', '-c', "; ".join(cmds)])
+        reset_virtual_servers(self.servers, servers)
+
+        self.runcmd(['sh', '-c', "supervisorctl start start.sh"])
+        self.check_ready()
+        self.init_asicdb_validator()
+        self.appldb = ApplDbValidator(self)
+
     # start processes in SWSS
     def start_swss(self):
         cmd = ""
@@ -352,6 +798,8 @@ class DockerVirtualSwitch(object):
         time.sleep(1)
 
     def init_asicdb_validator(self):
+        if self.asicdb:
+            self.asicdb.index.close()
         self.asicdb = AsicDbValidator(self)
 
     def runcmd(self, cmd):
@@ -417,99 +865,100 @@ class DockerVirtualSwitch(object):
         pubsub.psubscribe("__keyspace@1__:ASIC_STATE:%s*" % objpfx)
         return pubsub
 
-    def CountSubscribedObjects(self, pubsub, ignore=None, timeout=10):
+    def iter_subscribed_messages(self, pubsub, timeout=10, idle_ms=SUBSCRIBE_IDLE_MS, done=None):
+        """yield the messages of pubsub, blocking until the first keyspace notification for up to
+        timeout seconds, then until none is received for idle_ms milliseconds. With done, each
+        notification is waited for up to timeout seconds until done() returns True, the idle_ms
+        tail then catches the extra ones"""
+        deadline = time.time() + (idle_ms / 1000.0 if done and done() else timeout)
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            message = pubsub.get_message(timeout=remaining)
+            if not message:
+                break
+            yield message
+            if message['type'] == 'pmessage':
+                deadline = time.time() + (timeout if done and not done() else idle_ms / 1000.0)
+
+    def CountSubscribedObjects(self, pubsub, ignore=None, timeout=10, idle_ms=SUBSCRIBE_IDLE_MS, expected=None):
+        """count the hset and del notifications of pubsub until they stop, or until expected of
+        them are received and then idle_ms pass without any, see iter_subscribed_messages()"""
         nadd = 0
         ndel = 0
-        idle = 0
-        while True and idle < timeout:
-            message = pubsub.get_message()
-            if message:
-                print message
-                if ignore:
-                    fds = message['channel'].split(':')
-                    if fds[2] in ignore:
-                        continue
-                if message['data'] == 'hset':
-                    nadd += 1
-                elif message['data'] == 'del':
-                    ndel += 1
-                idle = 0
-            else:
-                time.sleep(1)
-                idle += 1
+        done = (lambda: nadd + ndel >= expected) if expected is not None else None
+        for message in self.iter_subscribed_messages(pubsub, timeout, idle_ms, done):
+            print message
+            if ignore:
+                fds = message['channel'].split(':')
+                if fds[2] in ignore:
+                    continue
+            if message['data'] == 'hset':
+                nadd += 1
+            elif message['data'] == 'del':
+                ndel += 1
 
         return (nadd, ndel)
 
-    def GetSubscribedAppDbObjects(self, pubsub, ignore=None, timeout=10):
+    def GetSubscribedAppDbObjects(self, pubsub, ignore=None, timeout=10, idle_ms=SUBSCRIBE_IDLE_MS, expected=None):
         r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.APPL_DB)
 
         addobjs = []
         delobjs = []
-        idle = 0
         prev_key = None
-
-        while True and idle < timeout:
-            message = pubsub.get_message()
-            if message:
-                print message
-                key = message['channel'].split(':', 1)[1]
-                # In producer/consumer_state_table scenarios, every entry will
-                # show up twice for every push/pop operation, so skip the second
-                # one to avoid double counting.
-                if key != None and key == prev_key:
-                    continue
-                # Skip instructions with meaningless keys. To be extended in the
-                # future to other undesired keys.
-                if key == "ROUTE_TABLE_KEY_SET" or key == "ROUTE_TABLE_DEL_SET":
+        done = (lambda: len(addobjs) + len(delobjs) >= expected) if expected is not None else None
+
+        for message in self.iter_subscribed_messages(pubsub, timeout, idle_ms, done):
+            print message
+            key = message['channel'].split(':', 1)[1]
+            # In producer/consumer_state_table scenarios, every entry will
+            # show up twice for every push/pop operation, so skip the second
+            # one to avoid double counting.
+            if key != None and key == prev_key:
+                continue
+            # Skip instructions with meaningless keys. To be extended in the
+            # future to other undesired keys.
+            if key == "ROUTE_TABLE_KEY_SET" or key == "ROUTE_TABLE_DEL_SET":
+                continue
+            if ignore:
+                fds = message['channel'].split(':')
+                if fds[2] in ignore:
                     continue
-                if ignore:
-                    fds = message['channel'].split(':')
-                    if fds[2] in ignore:
-                        continue
-
-                if message['data'] == 'hset':
-                    (_, k) = key.split(':', 1)
-                    value=r.hgetall(key)
-                    addobjs.append({'key':json.dumps(k), 'vals':json.dumps(value)})
-                    prev_key = key
-                elif message['data'] == 'del':
-                    (_, k) = key.split(':', 1)
-                    delobjs.append({'key':json.dumps(k)})
-                idle = 0
-            else:
-                time.sleep(1)
-                idle += 1
+
+            if message['data'] == 'hset':
+                (_, k) = key.split(':', 1)
+                value=r.hgetall(key)
+                addobjs.append({'key':json.dumps(k), 'vals':json.dumps(value)})
+                prev_key = key
+            elif message['data'] == 'del':
+                (_, k) = key.split(':', 1)
+                delobjs.append({'key':json.dumps(k)})
 
         return (addobjs, delobjs)
 
 
-    def GetSubscribedAsicDbObjects(self, pubsub, ignore=None, timeout=10):
+    def GetSubscribedAsicDbObjects(self, pubsub, ignore=None, timeout=10, idle_ms=SUBSCRIBE_IDLE_MS, expected=None):
         r = redis.Redis(unix_socket_path=self.redis_sock, db=swsscommon.ASIC_DB)
 
         addobjs = []
         delobjs = []
-        idle = 0
-
-        while True and idle < timeout:
-            message = pubsub.get_message()
-            if message:
-                print message
-                key = message['channel'].split(':', 1)[1]
-                if ignore:
-                    fds = message['channel'].split(':')
-                    if fds[2] in ignore:
-                        continue
-                if message['data'] == 'hset':
-                    value=r.hgetall(key)
-                    (_, t, k) = key.split(':', 2)
-                    addobjs.append({'type':t, 'key':k, 'vals':value})
-                elif message['data'] == 'del':
-                    (_, t, k) = key.split(':', 2)
-                    delobjs.append({'key':k})
-                idle = 0
-            else:
-                time.sleep(1)
-                idle += 1
+        done = (lambda: len(addobjs) + len(delobjs) >= expected) if expected is not None else None
+
+        for message in self.iter_subscribed_messages(pubsub, timeout, idle_ms, done):
+            print message
+            key = message['channel'].split(':', 1)[1]
+            if ignore:
+                fds = message['channel'].split(':')
+                if fds[2] in ignore:
+                    continue
+            if message['data'] == 'hset':
+                value=r.hgetall(key)
+                (_, t, k) = key.split(':', 2)
+                addobjs.append({'type':t, 'key':k, 'vals':value})
+            elif message['data'] == 'del':
+                (_, t, k) = key.split(':', 2)
+                delobjs.append({'key':k})
 
         return (addobjs, delobjs)
 
@@ -522,64 +971,176 @@ class DockerVirtualSwitch(object):
             pubsub.psubscribe("__keyspace@{}__:{}".format(db, obj))
         return pubsub
 
-    def GetSubscribedMessages(self, pubsub, timeout=10):
+    def GetSubscribedMessages(self, pubsub, timeout=10, idle_ms=SUBSCRIBE_IDLE_MS, expected=None):
         messages = []
-        delobjs = []
-        idle = 0
-        prev_key = None
+        nnotify = 0
+        done = (lambda: nnotify >= expected) if expected is not None else None
 
-        while True and idle < timeout:
-            message = pubsub.get_message()
-            if message:
-                messages.append(message)
-                idle = 0
-            else:
-                time.sleep(1)
-                idle += 1
+        for message in self.iter_subscribed_messages(pubsub, timeout, idle_ms, done):
+            messages.append(message)
+            if message['type'] == 'pmessage':
+                nnotify += 1
         return (messages)
 
+    def wait_for(self, check, patterns, timeout=DEF_WAIT_TIMEOUT):
+        """wait until check() returns a true value, checked first and again on every keyspace
+        notification of patterns, a list of (db, key pattern), or every WAIT_RECHECK_INTERVAL.
+        returns the last value of check()"""
+        r = redis.Redis(unix_socket_path=self.redis_sock)
+        pubsub = r.pubsub()
+        for db, pattern in patterns:
+            pubsub.psubscribe("__keyspace@{}__:{}".format(db, pattern))
+        deadline = time.time() + timeout
+        try:
+            result = check()
+            while not result:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if pubsub.get_message(timeout=min(remaining, WAIT_RECHECK_INTERVAL)):
+                    while pubsub.get_message():
+                        pass
+                result = check()
+        finally:
+            pubsub.close()
+        return result
+
+    def wait_for_entry(self, db, key, fields=None, timeout=DEF_WAIT_TIMEOUT):
+        """wait until the key exists in db with fields, a dict of the expected values"""
+        r = redis.Redis(unix_socket_path=self.redis_sock, db=db)
+        def check():
+            values = r.hgetall(key)
+            return bool(values) and all(values.get(f) == v for f, v in (fields or {}).items())
+        return self.wait_for(check, [(db, key)], timeout)
+
+    def wait_for_deleted_entry(self, db, key, timeout=DEF_WAIT_TIMEOUT):
+        r = redis.Redis(unix_socket_path=self.redis_sock, db=db)
+        return self.wait_for(lambda: not r.exists(key), [(db, key)], timeout)
+
+    def find_asic_objects(self, objtype, fields=None, key_filter=None):
+        """return the oids, or the keys of the non oid objects like routes and neighbors, of
+        objtype in ASIC_DB with fields, and whose key passes key_filter"""
+        index = self.asicdb.index
+        if fields:
+            # the objects with the first field are found from the index, then checked for the others
+            # in the objects the index was synced to by find()
+            (field, value) = sorted(fields.items())[0]
+            keys = index.find(objtype, field, value)
+            objs = index.objects.get(objtype, {})
+            keys = [key for key in keys if all(objs[key].get(f) == v for f, v in fields.items())]
+        else:
+            keys = list(index.get_objects(objtype))
+        if key_filter:
+            keys = [key for key in keys if key_filter(key)]
+        return keys
+
+    def wait_for_asic_object(self, objtype, fields=None, key_filter=None, timeout=DEF_WAIT_TIMEOUT):
+        """wait until an object of objtype with fields exists in ASIC_DB, returns its oid or key"""
+        objs = self.wait_for(lambda: self.find_asic_objects(objtype, fields, key_filter),
+                             [(swsscommon.ASIC_DB, "ASIC_STATE:{}:*".format(objtype))], timeout)
+        return objs[0] if objs else None
+
+    def wait_for_no_asic_object(self, objtype, fields=None, key_filter=None, timeout=DEF_WAIT_TIMEOUT):
+        return self.wait_for(lambda: not self.find_asic_objects(objtype, fields, key_filter),
+                             [(swsscommon.ASIC_DB, "ASIC_STATE:{}:*".format(objtype))], timeout)
+
+    def wait_for_asic_idle(self, idle=ASIC_IDLE_TIME, timeout=DEF_WAIT_TIMEOUT):
+        """wait until ASIC_DB has no change for idle seconds"""
+        r = redis.Redis(unix_socket_path=self.redis_sock)
+        pubsub = r.pubsub()
+        pubsub.psubscribe("__keyspace@{}__:ASIC_STATE:*".format(swsscommon.ASIC_DB))
+        deadline = time.time() + timeout
+        try:
+            # skip the subscribe confirmation
+            pubsub.get_message(timeout=idle)
+            while time.time() < deadline:
+                if not pubsub.get_message(timeout=min(idle, max(deadline - time.time(), 0))):
+                    return True
+                while pubsub.get_message():
+                    pass
+        finally:
+            pubsub.close()
+        return False
+
+    def is_vlan_member_in_asic(self, vlan, interface):
+        vlan_oids = self.find_asic_objects("SAI_OBJECT_TYPE_VLAN", {"SAI_VLAN_ATTR_VLAN_ID": vlan})
+        bridge_ports = self.find_asic_objects("SAI_OBJECT_TYPE_BRIDGE_PORT",
+                                              {"SAI_BRIDGE_PORT_ATTR_PORT_ID": self.asicdb.portnamemap[interface]})
+        if not vlan_oids or not bridge_ports:
+            return False
+        return bool(self.find_asic_objects("SAI_OBJECT_TYPE_VLAN_MEMBER",
+                                           {"SAI_VLAN_MEMBER_ATTR_VLAN_ID": vlan_oids[0],
+                                            "SAI_VLAN_MEMBER_ATTR_BRIDGE_PORT_ID": bridge_ports[0]}))
+
+    def wait_for_vlan_member(self, vlan, interface, exists=True, timeout=HELPER_WAIT_TIMEOUT):
+        # vlanmgrd sets the member in STATE_DB once it is created in kernel
+        state_key = "VLAN_MEMBER_TABLE|Vlan{}|{}".format(vlan, interface)
+        if exists:
+            self.wait_for_entry(swsscommon.STATE_DB, state_key, timeout=timeout)
+        else:
+            self.wait_for_deleted_entry(swsscommon.STATE_DB, state_key, timeout=timeout)
+        if interface not in self.asicdb.portnamemap:
+            return self.wait_for_asic_idle(timeout=timeout)
+        return self.wait_for(lambda: self.is_vlan_member_in_asic(vlan, interface) == exists,
+                             [(swsscommon.ASIC_DB, "ASIC_STATE:SAI_OBJECT_TYPE_VLAN_MEMBER:*"),
+                              (swsscommon.ASIC_DB, "ASIC_STATE:SAI_OBJECT_TYPE_BRIDGE_PORT:*")], timeout)
+
+    def wait_for_ip2me_route(self, ip, exists=True, timeout=HELPER_WAIT_TIMEOUT):
+        addr = ip.split("/")[0]
+        dest = addr + ("/128" if ":" in addr else "/32")
+        key_filter = lambda key: json.loads(key).get("dest") == dest
+        if exists:
+            return self.wait_for_asic_object("SAI_OBJECT_TYPE_ROUTE_ENTRY", key_filter=key_filter, timeout=timeout)
+        return self.wait_for_no_asic_object("SAI_OBJECT_TYPE_ROUTE_ENTRY", key_filter=key_filter, timeout=timeout)
+
+    def wait_for_neighbor(self, ip, exists=True, timeout=HELPER_WAIT_TIMEOUT):
+        key_filter = lambda key: json.loads(key).get("ip") == ip
+        if exists:
+            return self.wait_for_asic_object("SAI_OBJECT_TYPE_NEIGHBOR_ENTRY", key_filter=key_filter, timeout=timeout)
+        return self.wait_for_no_asic_object("SAI_OBJECT_TYPE_NEIGHBOR_ENTRY", key_filter=key_filter, timeout=timeout)
+
     def get_map_iface_bridge_port_id(self, asic_db):
         port_id_2_iface = self.asicdb.portoidmap
-        tbl = swsscommon.Table(asic_db, "ASIC_STATE:SAI_OBJECT_TYPE_BRIDGE_PORT")
         iface_2_bridge_port_id = {}
-        for key in tbl.getKeys():
-            status, data = tbl.get(key)
-            assert status
-            values = dict(data)
+        for key, values in self.asicdb.index.get_objects("SAI_OBJECT_TYPE_BRIDGE_PORT").items():
             iface_id = values["SAI_BRIDGE_PORT_ATTR_PORT_ID"]
             iface_name = port_id_2_iface[iface_id]
             iface_2_bridge_port_id[iface_name] = key
 
         return iface_2_bridge_port_id
 
-    def get_vlan_oid(self, asic_db, vlan_id):
-        tbl = swsscommon.Table(asic_db, "ASIC_STATE:SAI_OBJECT_TYPE_VLAN")
-        keys = tbl.getKeys()
-
-        for key in keys:
-            status, fvs = tbl.get(key)
-            assert status, "Error reading from table %s" % "ASIC_STATE:SAI_OBJECT_TYPE_VLAN"
+    def get_table_snapshot(self, db, table):
+        """snapshot of the table in db, a swsscommon.DBConnector, taken from the AsicDbIndex
+        for the ASIC_STATE tables, or read in one round trip"""
+        if db.getDbId() == swsscommon.ASIC_DB and table.startswith("ASIC_STATE:") and self.asicdb:
+            return TableSnapshot(dict(self.asicdb.index.get_objects(table[len("ASIC_STATE:"):])))
+        return TableSnapshot.read(self.redis_sock, db.getDbId(), table)
 
-            for k, v in fvs:
-                if k == "SAI_VLAN_ATTR_VLAN_ID" and v == vlan_id:
-                    return True, key
+    def get_vlan_oid(self, asic_db, vlan_id):
+        snapshot = self.get_table_snapshot(asic_db, "ASIC_STATE:SAI_OBJECT_TYPE_VLAN")
+        keys = snapshot.find("SAI_VLAN_ATTR_VLAN_ID", vlan_id)
+        if keys:
+            return True, keys[0]
 
         return False, "Not found vlan id %s" % vlan_id
 
     def is_table_entry_exists(self, db, table, keyregex, attributes):
-        tbl = swsscommon.Table(db, table)
-        keys = tbl.getKeys()
+        snapshot = self.get_table_snapshot(db, table)
+
+        # the entries with all the attributes are found from the indexes
+        for key in snapshot.find_all(attributes):
+            if re.match(keyregex, key) is not None:
+                return True, []
 
         extra_info = []
-        for key in keys:
+        for key in snapshot.keys():
             if re.match(keyregex, key) is None:
                 continue
 
-            status, fvs = tbl.get(key)
-            assert status, "Error reading from table %s" % table
+            fvs = snapshot.get(key)
 
             d_attributes = dict(attributes)
-            for k, v in fvs:
+            for k, v in fvs.items():
                 if k in d_attributes and d_attributes[k] == v:
                     del d_attributes[k]
 
@@ -593,8 +1154,8 @@ class DockerVirtualSwitch(object):
             return False, extra_info
 
     def all_table_entry_has(self, db, table, keyregex, attributes):
-        tbl = swsscommon.Table(db, table)
-        keys = tbl.getKeys()
+        snapshot = self.get_table_snapshot(db, table)
+        keys = snapshot.keys()
         extra_info = []
 
         if len(keys) == 0:
@@ -605,11 +1166,10 @@ class DockerVirtualSwitch(object):
             if re.match(keyregex, key) is None:
                 continue
 
-            status, fvs = tbl.get(key)
-            assert status, "Error reading from table %s" % table
+            fvs = snapshot.get(key)
 
             d_attributes = dict(attributes)
-            for k, v in fvs:
+            for k, v in fvs.items():
                 if k in d_attributes and d_attributes[k] == v:
                     del d_attributes[k]
 
@@ -620,8 +1180,8 @@ class DockerVirtualSwitch(object):
         return True, extra_info
 
     def all_table_entry_has_no(self, db, table, keyregex, attributes_list):
-        tbl = swsscommon.Table(db, table)
-        keys = tbl.getKeys()
+        snapshot = self.get_table_snapshot(db, table)
+        keys = snapshot.keys()
         extra_info = []
 
         if len(keys) == 0:
@@ -632,10 +1192,9 @@ class DockerVirtualSwitch(object):
             if re.match(keyregex, key) is None:
                 continue
 
-            status, fvs = tbl.get(key)
-            assert status, "Error reading from table %s" % table
+            fvs = snapshot.get(key)
 
-            for k, v in fvs:
+            for k, v in fvs.items():
                 if k in attributes_list:
                     extra_info.append("Unexpected attribute %s was found for key %s" % (k, key))
                     return False, extra_info
@@ -643,8 +1202,8 @@ class DockerVirtualSwitch(object):
         return True, extra_info
 
     def is_fdb_entry_exists(self, db, table, key_values, attributes):
-        tbl =  swsscommon.Table(db, table)
-        keys = tbl.getKeys()
+        snapshot = self.get_table_snapshot(db, table)
+        keys = snapshot.keys()
 
         exists = False
         extra_info = []
@@ -665,11 +1224,10 @@ class DockerVirtualSwitch(object):
             if not key_found:
                 continue
 
-            status, fvs = tbl.get(key)
-            assert status, "Error reading from table %s" % table
+            fvs = snapshot.get(key)
 
             d_attributes = dict(attributes)
-            for k, v in fvs:
+            for k, v in fvs.items():
                 if k in d_attributes and d_attributes[k] == v:
                     del d_attributes[k]
 
@@ -690,39 +1248,39 @@ class DockerVirtualSwitch(object):
         tbl = swsscommon.Table(self.cdb, "VLAN")
         fvs = swsscommon.FieldValuePairs([("vlanid", vlan)])
         tbl.set("Vlan" + vlan, fvs)
-        time.sleep(1)
+        self.wait_for_asic_object("SAI_OBJECT_TYPE_VLAN", {"SAI_VLAN_ATTR_VLAN_ID": vlan}, timeout=HELPER_WAIT_TIMEOUT)
 
     def remove_vlan(self, vlan):
         tbl = swsscommon.Table(self.cdb, "VLAN")
         tbl._del("Vlan" + vlan)
-        time.sleep(1)
+        self.wait_for_no_asic_object("SAI_OBJECT_TYPE_VLAN", {"SAI_VLAN_ATTR_VLAN_ID": vlan}, timeout=HELPER_WAIT_TIMEOUT)
 
     def create_vlan_member(self, vlan, interface):
         tbl = swsscommon.Table(self.cdb, "VLAN_MEMBER")
         fvs = swsscommon.FieldValuePairs([("tagging_mode", "untagged")])
         tbl.set("Vlan" + vlan + "|" + interface, fvs)
-        time.sleep(1)
+        self.wait_for_vlan_member(vlan, interface)
 
     def remove_vlan_member(self, vlan, interface):
         tbl = swsscommon.Table(self.cdb, "VLAN_MEMBER")
         tbl._del("Vlan" + vlan + "|" + interface)
-        time.sleep(1)
+        self.wait_for_vlan_member(vlan, interface, exists=False)
 
     def create_vlan_member_tagged(self, vlan, interface):
         tbl = swsscommon.Table(self.cdb, "VLAN_MEMBER")
         fvs = swsscommon.FieldValuePairs([("tagging_mode", "tagged")])
         tbl.set("Vlan" + vlan + "|" + interface, fvs)
-        time.sleep(1)
+        self.wait_for_vlan_member(vlan, interface)
 
     def remove_vlan_member(self, vlan, interface):
         tbl = swsscommon.Table(self.cdb, "VLAN_MEMBER")
         tbl._del("Vlan" + vlan + "|" + interface)
-        time.sleep(1)
+        self.wait_for_vlan_member(vlan, interface, exists=False)
 
     def remove_vlan(self, vlan):
         tbl = swsscommon.Table(self.cdb, "VLAN")
         tbl._del("Vlan" + vlan)
-        time.sleep(1)
+        self.wait_for_no_asic_object("SAI_OBJECT_TYPE_VLAN", {"SAI_VLAN_ATTR_VLAN_ID": vlan}, timeout=HELPER_WAIT_TIMEOUT)
 
     def set_interface_status(self, interface, admin_status):
         if interface.startswith("PortChannel"):
@@ -734,7 +1292,13 @@ class DockerVirtualSwitch(object):
         tbl = swsscommon.Table(self.cdb, tbl_name)
         fvs = swsscommon.FieldValuePairs([("admin_status", admin_status)])
         tbl.set(interface, fvs)
-        time.sleep(1)
+        if tbl_name == "PORT" and interface in self.asicdb.portnamemap:
+            self.wait_for_entry(swsscommon.ASIC_DB,
+                                "ASIC_STATE:SAI_OBJECT_TYPE_PORT:" + self.asicdb.portnamemap[interface],
+                                {"SAI_PORT_ATTR_ADMIN_STATE": "true" if admin_status == "up" else "false"},
+                                timeout=HELPER_WAIT_TIMEOUT)
+        else:
+            self.wait_for_asic_idle(timeout=HELPER_WAIT_TIMEOUT)
 
     def add_ip_address(self, interface, ip):
         if interface.startswith("PortChannel"):
@@ -747,7 +1311,10 @@ class DockerVirtualSwitch(object):
         fvs = swsscommon.FieldValuePairs([("NULL", "NULL")])
         tbl.set(interface, fvs)
         tbl.set(interface + "|" + ip, fvs)
-        time.sleep(1)
+        # intfmgrd sets the address in STATE_DB once it is configured in kernel
+        self.wait_for_entry(swsscommon.STATE_DB, "INTERFACE_TABLE|" + interface + "|" + ip, {"state": "ok"},
+                            timeout=HELPER_WAIT_TIMEOUT)
+        self.wait_for_ip2me_route(ip)
 
     def remove_ip_address(self, interface, ip):
         if interface.startswith("PortChannel"):
@@ -759,7 +1326,9 @@ class DockerVirtualSwitch(object):
         tbl = swsscommon.Table(self.cdb, tbl_name)
         tbl._del(interface + "|" + ip);
         tbl._del(interface);
-        time.sleep(1)
+        self.wait_for_deleted_entry(swsscommon.STATE_DB, "INTERFACE_TABLE|" + interface + "|" + ip,
+                                    timeout=HELPER_WAIT_TIMEOUT)
+        self.wait_for_ip2me_route(ip, exists=False)
 
     def set_mtu(self, interface, mtu):
         if interface.startswith("PortChannel"):
@@ -771,19 +1340,21 @@ class DockerVirtualSwitch(object):
         tbl = swsscommon.Table(self.cdb, tbl_name)
         fvs = swsscommon.FieldValuePairs([("mtu", mtu)])
         tbl.set(interface, fvs)
-        time.sleep(1)
+        if tbl_name == "PORT":
+            self.wait_for_entry(swsscommon.APPL_DB, "PORT_TABLE:" + interface, {"mtu": mtu}, timeout=HELPER_WAIT_TIMEOUT)
+        self.wait_for_asic_idle(timeout=HELPER_WAIT_TIMEOUT)
 
     def add_neighbor(self, interface, ip, mac):
         tbl = swsscommon.ProducerStateTable(self.pdb, "NEIGH_TABLE")
         fvs = swsscommon.FieldValuePairs([("neigh", mac),
                                           ("family", "IPv4")])
         tbl.set(interface + ":" + ip, fvs)
-        time.sleep(1)
+        self.wait_for_neighbor(ip)
 
     def remove_neighbor(self, interface, ip):
         tbl = swsscommon.ProducerStateTable(self.pdb, "NEIGH_TABLE")
         tbl._del(interface + ":" + ip)
-        time.sleep(1)
+        self.wait_for_neighbor(ip, exists=False)
 
     def setup_db(self):
         self.pdb = swsscommon.DBConnector(0, self.redis_sock, 0)
@@ -820,19 +1391,42 @@ class DockerVirtualSwitch(object):
 
         ntf.send("set_ro", key, fvp)
 
+@pytest.yield_fixture(scope="session")
+def reused_dvs():
+    """the dvs kept between the test modules with --reuse-dvs, by fake platform"""
+    dvss = {}
+    yield dvss
+    for dvs in dvss.values():
+        dvs.destroy()
+
 @pytest.yield_fixture(scope="module")
-def dvs(request):
+def dvs(request, reused_dvs):
     name = request.config.getoption("--dvsname")
     keeptb = request.config.getoption("--keeptb")
     imgname = request.config.getoption("--imgname")
+    reuse = request.config.getoption("--reuse-dvs")
     fakeplatform = getattr(request.module, "DVS_FAKE_PLATFORM", None)
-    dvs = DockerVirtualSwitch(name, imgname, keeptb, fakeplatform)
+    dvs = reused_dvs.pop(fakeplatform, None) if reuse else None
+    if dvs:
+        try:
+            dvs.restore_baseline()
+        except:
+            dvs.get_logs()
+            dvs.destroy()
+            dvs = None
+    if not dvs:
+        dvs = DockerVirtualSwitch(name, imgname, keeptb, fakeplatform)
+        if reuse:
+            dvs.take_baseline()
     yield dvs
     if name == None:
         dvs.get_logs(request.module.__name__)
     else:
         dvs.get_logs()
-    dvs.destroy()
+    if reuse:
+        reused_dvs[fakeplatform] = dvs
+    else:
+        dvs.destroy()
 
 @pytest.yield_fixture
 def testlog(request, dvs):
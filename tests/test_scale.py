@@ -0,0 +1,181 @@
+from swsscommon import swsscommon
+
+import time
+import json
+import redis
+import pytest
+import threading
+
+# minimum programming rate, in entries/s, a scale test waits for before failing
+MIN_PROGRAM_RATE = 100
+
+def pytest_generate_tests(metafunc):
+    if "entries" in metafunc.fixturenames:
+        entries = [int(n) for n in metafunc.config.getoption("--scale-entries").split(",")]
+        metafunc.parametrize("entries", entries)
+
+@pytest.yield_fixture(scope="module")
+def scale_results(request):
+    results = []
+    yield results
+    print "%-10s %-6s %-10s %-10s %-12s %-10s %-10s" % \
+            ('test', 'op', 'entries', 'push_ms', 'entries/s', 'p50_ms', 'p99_ms')
+    for r in results:
+        print "%-10s %-6s %-10d %-10d %-12d %-10.1f %-10.1f" % \
+                (r['test'], r['op'], r['entries'], r['push_elapsed'], r['rate'], r['p50'], r['p99'])
+    path = request.config.getoption("--scale-results")
+    if path:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=4)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round((len(values) - 1) * p / 100.0))]
+
+class AsicObjectWatcher(object):
+    """records the time the ASIC_STATE objects of objtype are created or removed, from their
+    keyspace notifications received by a thread. key_to_entry maps the key of an object to the
+    entry it was programmed from"""
+
+    def __init__(self, dvs, objtype, key_to_entry):
+        r = redis.Redis(unix_socket_path=dvs.redis_sock, db=swsscommon.ASIC_DB)
+        self.prefix = "__keyspace@%d__:ASIC_STATE:%s:" % (swsscommon.ASIC_DB, objtype)
+        self.pubsub = r.pubsub()
+        self.pubsub.psubscribe(self.prefix + "*")
+        self.pubsub.get_message(timeout=1)
+        self.key_to_entry = key_to_entry
+        self.lock = threading.Lock()
+        self.op = None
+        self.pending = set()
+        self.times = {}
+        self.done = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            message = self.pubsub.get_message(timeout=0.1)
+            if not message or message['type'] != 'pmessage':
+                continue
+            now = time.time()
+            with self.lock:
+                if message['data'] != self.op:
+                    continue
+                entry = self.key_to_entry(message['channel'][len(self.prefix):])
+                if entry in self.pending:
+                    self.pending.remove(entry)
+                    self.times[entry] = now
+                    if not self.pending:
+                        self.done.set()
+
+    def expect(self, op, entries):
+        """record the time of the op, 'hset' or 'del', on the objects of the entries"""
+        with self.lock:
+            self.op = op
+            self.pending = set(entries)
+            self.times = {}
+            self.done.clear()
+
+    def wait(self, timeout):
+        self.done.wait(timeout)
+        with self.lock:
+            return len(self.pending)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.pubsub.close()
+
+class TestScale(object):
+    def run_stage(self, dvs, watcher, table, entries, pairs_of, op, results, test):
+        """push the entries to APPL_DB table through a ProducerStateTable, set with the pairs
+        returned by pairs_of(entry) or deleted, and wait for their ASIC_STATE objects"""
+        tbl = swsscommon.ProducerStateTable(dvs.pdb, table)
+        watcher.expect("hset" if op == "set" else "del", entries)
+
+        pushed = {}
+        start = time.time()
+        for entry in entries:
+            pushed[entry] = time.time()
+            if op == "set":
+                tbl.set(entry, swsscommon.FieldValuePairs(pairs_of(entry)))
+            else:
+                tbl._del(entry)
+        push_elapsed = time.time() - start
+
+        missing = watcher.wait(30 + len(entries) / MIN_PROGRAM_RATE)
+        assert missing == 0, "%d of %d %s entries not programmed in ASIC_DB" % (missing, len(entries), table)
+
+        elapsed = max(watcher.times.values()) - start
+        latencies = [(watcher.times[entry] - pushed[entry]) * 1000 for entry in entries]
+        results.append({
+            'test': test,
+            'op': op,
+            'entries': len(entries),
+            'push_elapsed': int(push_elapsed * 1000),
+            'elapsed': int(elapsed * 1000),
+            'rate': len(entries) / elapsed,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def test_RouteScale(self, dvs, testlog, entries, scale_results):
+        dvs.setup_db()
+        dvs.set_interface_status("Ethernet0", "up")
+        dvs.add_ip_address("Ethernet0", "10.0.0.0/31")
+        dvs.add_neighbor("Ethernet0", "10.0.0.1", "00:00:00:00:00:01")
+
+        prefixes = ["%d.%d.%d.0/24" % (20 + (i >> 16), i >> 8 & 0xff, i & 0xff) for i in range(entries)]
+        watcher = AsicObjectWatcher(dvs, "SAI_OBJECT_TYPE_ROUTE_ENTRY", lambda key: json.loads(key)["dest"])
+        try:
+            pairs = [("nexthop", "10.0.0.1"), ("ifname", "Ethernet0")]
+            self.run_stage(dvs, watcher, "ROUTE_TABLE", prefixes, lambda prefix: pairs, "set", scale_results, "route")
+            self.run_stage(dvs, watcher, "ROUTE_TABLE", prefixes, None, "del", scale_results, "route")
+        finally:
+            watcher.close()
+            dvs.remove_neighbor("Ethernet0", "10.0.0.1")
+            dvs.remove_ip_address("Ethernet0", "10.0.0.0/31")
+            dvs.set_interface_status("Ethernet0", "down")
+
+    def test_NeighborScale(self, dvs, testlog, entries, scale_results):
+        dvs.setup_db()
+        dvs.set_interface_status("Ethernet4", "up")
+        dvs.add_ip_address("Ethernet4", "11.0.0.1/8")
+
+        ips = ["11.%d.%d.%d" % ((i + 2) >> 16 & 0xff, (i + 2) >> 8 & 0xff, (i + 2) & 0xff) for i in range(entries)]
+        watcher = AsicObjectWatcher(dvs, "SAI_OBJECT_TYPE_NEIGHBOR_ENTRY",
+                                    lambda key: "Ethernet4:" + json.loads(key)["ip"])
+        try:
+            keys = ["Ethernet4:" + ip for ip in ips]
+            def pairs_of(key):
+                i = len("Ethernet4:11.")
+                mac = "00:10:00:%02x:%02x:%02x" % tuple(int(b) for b in key[i:].split("."))
+                return [("neigh", mac), ("family", "IPv4")]
+            self.run_stage(dvs, watcher, "NEIGH_TABLE", keys, pairs_of, "set", scale_results, "neighbor")
+            self.run_stage(dvs, watcher, "NEIGH_TABLE", keys, None, "del", scale_results, "neighbor")
+        finally:
+            watcher.close()
+            dvs.remove_ip_address("Ethernet4", "11.0.0.1/8")
+            dvs.set_interface_status("Ethernet4", "down")
+
+    def test_FdbScale(self, dvs, testlog, entries, scale_results):
+        dvs.setup_db()
+        dvs.create_vlan("99")
+        dvs.create_vlan_member("99", "Ethernet8")
+        dvs.set_interface_status("Ethernet8", "up")
+
+        keys = ["Vlan99:00-20-%02X-%02X-%02X-%02X" % (i >> 24 & 0xff, i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+                for i in range(entries)]
+        watcher = AsicObjectWatcher(dvs, "SAI_OBJECT_TYPE_FDB_ENTRY",
+                                    lambda key: "Vlan99:" + json.loads(key)["mac"].upper().replace(":", "-"))
+        try:
+            pairs = [("port", "Ethernet8"), ("type", "dynamic")]
+            self.run_stage(dvs, watcher, "FDB_TABLE", keys, lambda key: pairs, "set", scale_results, "fdb")
+            self.run_stage(dvs, watcher, "FDB_TABLE", keys, None, "del", scale_results, "fdb")
+        finally:
+            watcher.close()
+            dvs.set_interface_status("Ethernet8", "down")
+            dvs.remove_vlan_member("99", "Ethernet8")
+            dvs.remove_vlan("99")
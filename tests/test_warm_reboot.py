@@ -633,7 +633,7 @@ class TestWarmReboot(object):
         # 4 neighbor removal in asic db
         check_syslog_for_neighbor_entry(dvs, marker, 0, 2, "ipv4")
         check_syslog_for_neighbor_entry(dvs, marker, 0, 2, "ipv6")
-        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub)
+        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, expected=4)
         assert nadd == 0
         assert ndel == 4
 
@@ -706,7 +706,7 @@ class TestWarmReboot(object):
         # 4 neighbor creation in asic db
         check_syslog_for_neighbor_entry(dvs, marker, 2, 0, "ipv4")
         check_syslog_for_neighbor_entry(dvs, marker, 2, 0, "ipv6")
-        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub)
+        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, expected=4)
         assert nadd == 4
         assert ndel == 0
 
@@ -795,7 +795,7 @@ class TestWarmReboot(object):
         # 4 set, 4 removes for neighbor in asic db
         check_syslog_for_neighbor_entry(dvs, marker, 2, 2, "ipv4")
         check_syslog_for_neighbor_entry(dvs, marker, 2, 2, "ipv6")
-        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub)
+        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, expected=8)
         assert nadd == 4
         assert ndel == 4
 
@@ -1217,7 +1217,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1225,7 +1225,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet0", "nexthop": "111.0.0.2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "192.168.100.0/24"
@@ -1254,13 +1254,13 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key == "192.168.100.0/24"
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key['dest'] == "192.168.100.0/24"
@@ -1289,7 +1289,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1297,7 +1297,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet0,Ethernet4,Ethernet8", "nexthop": "111.0.0.2,122.0.0.2,133.0.0.2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "192.168.200.0/24"
@@ -1326,13 +1326,13 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key == "192.168.200.0/24"
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key['dest'] == "192.168.200.0/24"
@@ -1362,7 +1362,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
          # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1370,7 +1370,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet0,Ethernet4,Ethernet8", "nexthop": "111.0.0.2,122.0.0.2,133.0.0.2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "192.168.1.3/32"
@@ -1400,7 +1400,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
          # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1408,7 +1408,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet0,Ethernet4", "nexthop": "111.0.0.2,122.0.0.2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "192.168.1.3/32"
@@ -1437,7 +1437,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1445,7 +1445,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet0", "nexthop": "1110::2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "fc00:4:4::1/128"
@@ -1473,13 +1473,13 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key == "fc00:4:4::1"
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key['dest'] == "fc00:4:4::1/128"
@@ -1535,7 +1535,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1543,7 +1543,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet0", "nexthop": "111.0.0.2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "192.168.100.0/24"
@@ -1572,13 +1572,13 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key == "192.168.100.0/24"
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 0 and len(delobjs) == 1
         rt_key = json.loads(delobjs[0]['key'])
         assert rt_key['dest'] == "192.168.100.0/24"
@@ -1647,7 +1647,7 @@ class TestWarmReboot(object):
         swss_app_check_warmstart_state(state_db, "bgp", "reconciled")
 
         # Verify the changed prefix is seen in swss
-        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAppDbObjects(pubsubAppDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         rt_val = json.loads(addobjs[0]['vals'])
@@ -1655,7 +1655,7 @@ class TestWarmReboot(object):
         assert rt_val == {"ifname": "Ethernet4", "nexthop": "122.0.0.2"}
 
         # Verify the changed prefix is seen in sairedis
-        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB)
+        (addobjs, delobjs) = dvs.GetSubscribedAsicDbObjects(pubsubAsicDB, expected=1)
         assert len(addobjs) == 1 and len(delobjs) == 0
         rt_key = json.loads(addobjs[0]['key'])
         assert rt_key['dest'] == "192.168.100.0/24"
@@ -1980,7 +1980,7 @@ class TestWarmReboot(object):
 
         check_redis_neigh_entries(dvs, tbl, 2*(NUM_OF_NEIGHS+NUM_OF_NEIGHS/2))
 
-        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub)
+        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, expected=NUM_OF_NEIGHS)
         assert nadd == NUM_OF_NEIGHS #ipv4 and ipv6
         assert ndel == 0
 
@@ -2000,7 +2000,7 @@ class TestWarmReboot(object):
 
         check_redis_neigh_entries(dvs, tbl, 2*NUM_OF_NEIGHS)
 
-        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub)
+        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, expected=NUM_OF_NEIGHS)
         assert nadd == 0
         assert ndel == NUM_OF_NEIGHS #ipv4 and ipv6
 
@@ -2057,7 +2057,7 @@ class TestWarmReboot(object):
         # check syslog and sairedis.rec file for activities
         check_syslog_for_neighbor_entry(dvs, marker, 0, NUM_OF_NEIGHS/2, "ipv4")
         check_syslog_for_neighbor_entry(dvs, marker, 0, NUM_OF_NEIGHS/2, "ipv6")
-        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub)
+        (nadd, ndel) = dvs.CountSubscribedObjects(pubsub, expected=NUM_OF_NEIGHS)
         assert nadd == 0
         assert ndel == NUM_OF_NEIGHS
 